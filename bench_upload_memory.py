@@ -0,0 +1,116 @@
+import base64
+import json
+import os
+import sys
+import tracemalloc
+from contextlib import ExitStack
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "sinavkagidi"))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "otosinavkagidi.settings")
+os.environ.setdefault("SECRET_KEY", "bench")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.core.files.uploadedfile import SimpleUploadedFile  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test import RequestFactory, override_settings  # noqa: E402
+from django.test.utils import setup_test_environment  # noqa: E402
+
+from sinavokuyucu import views  # noqa: E402
+
+# --- AYARLAR ---
+# Ölçümde kullanılacak resim; yoksa bu boyutta rastgele veri üretilir.
+IMAGE_PATH = "sample_answer.jpeg"
+SYNTHETIC_SIZE_MB = 8
+QUESTION = "Nuri Efendi'nin ruh hâli nasıldır?"
+REFERENCE_TEXT = "Sabahın köründe soğukta işe gitmek zorunda olduğu için mutsuzdur."
+
+# Değişiklikten önceki yükleme ayarları (Django varsayılanları, boyut sınırı yok).
+OLD_UPLOAD_SETTINGS = {
+    "FILE_UPLOAD_HANDLERS": [
+        "django.core.files.uploadhandler.MemoryFileUploadHandler",
+        "django.core.files.uploadhandler.TemporaryFileUploadHandler",
+    ],
+    "FILE_UPLOAD_MAX_MEMORY_SIZE": 2621440,
+}
+
+
+def load_image_bytes():
+    if os.path.exists(IMAGE_PATH):
+        with open(IMAGE_PATH, "rb") as f:
+            return f.read()
+    print(f"UYARI: '{IMAGE_PATH}' bulunamadı, {SYNTHETIC_SIZE_MB} MB rastgele veri kullanılıyor.")
+    return os.urandom(SYNTHETIC_SIZE_MB * 1024 * 1024)
+
+
+def old_streamed_image(upload):
+    """Önceki yol: read() -> b64encode -> decode; resim string olarak payload'a girer."""
+    return base64.b64encode(upload.read()).decode('utf-8')
+
+
+class FakeOllamaResponse:
+    status_code = 200
+    text = json.dumps({"message": {"content": '{"grade": 8, "reason": "Ruh hâli ve sebebi yazılmış."}'},
+                       "prompt_eval_count": 100, "eval_count": 20})
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return json.loads(self.text)
+
+
+def fake_post(url, timeout=None, **kwargs):
+    """Ollama'ya gönderilecek gövdeyi requests gibi üretip tüketir; ağa çıkmaz."""
+    if "json" in kwargs:
+        body_size = len(json.dumps(kwargs["json"]).encode('utf-8'))  # requests'in json= ile yaptığı
+    else:
+        body_size = sum(len(chunk) for chunk in kwargs["data"])
+    fake_post.body_size = max(fake_post.body_size, body_size)
+    return FakeOllamaResponse()
+
+
+fake_post.body_size = 0
+
+
+def measure(name, image_bytes, old_path):
+    """Tek bir /grade/ isteğinin (multipart ayrıştırma + view + Ollama gövdesi) bellek zirvesini ölçer."""
+    # İstek gövdesi ölçümden önce hazırlanır; sunucuya soketten gelen veriyi temsil eder.
+    request = RequestFactory().post("/api/sinav/grade/", data={
+        "image": SimpleUploadedFile("cevap.jpeg", image_bytes, content_type="image/jpeg"),
+        "question": QUESTION,
+        "reference_text": REFERENCE_TEXT,
+    })
+    fake_post.body_size = 0
+    with ExitStack() as stack:
+        stack.enter_context(mock.patch("sinavokuyucu.model_manager.requests.post", fake_post))
+        if old_path:
+            stack.enter_context(override_settings(**OLD_UPLOAD_SETTINGS))
+            stack.enter_context(mock.patch("sinavokuyucu.views.StreamedImage", old_streamed_image))
+        tracemalloc.start()
+        response = views.grade_handwritten_answer(request)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    if response.status_code != 200:
+        raise RuntimeError(f"{name}: beklenmeyen yanıt {response.status_code} {response.data}")
+    print(f"{name:<22} Ollama gövdesi: {fake_post.body_size / 1024 / 1024:7.2f} MB | "
+          f"istek bellek zirvesi: {peak / 1024 / 1024:7.2f} MB")
+    return peak
+
+
+def run_benchmark():
+    setup_test_environment()
+    # Sonuçlar geçici (bellek içi) test veritabanına yazılır; db.sqlite3'e dokunulmaz.
+    connection.creation.create_test_db(verbosity=0)
+    image_bytes = load_image_bytes()
+    print(f"Resim boyutu: {len(image_bytes) / 1024 / 1024:.2f} MB")
+    old_peak = measure("Eski (read + base64)", image_bytes, old_path=True)
+    new_peak = measure("Yeni (akışlı gövde)", image_bytes, old_path=False)
+    print(f"İstek başına bellek zirvesi {old_peak / max(new_peak, 1):.1f} kat azaldı.")
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "otosinavkagidi.settings")
+# Sunucu süreçlerinde modeller varsayılan olarak başlangıçta ısıtılır (bkz. settings).
+os.environ.setdefault("OLLAMA_WARMUP_ON_STARTUP", "1")
 
 application = get_asgi_application()
@@ -121,7 +121,81 @@ USE_TZ = True
 
 STATIC_URL = "static/"
 
+# Uploaded files (exam templates)
+
+MEDIA_URL = "media/"
+MEDIA_ROOT = BASE_DIR / "media"
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+
+# Ollama model warm-up / residency
+# Modellerin bellekte kalma süresi (Ollama 'keep_alive' formatı) ve arka plan ısıtma ayarları.
+
+OLLAMA_BASE_URL = os.getenv('OLLAMA_BASE_URL', "http://localhost:11434")
+
+OLLAMA_KEEP_ALIVE = {
+    "llama3.2-vision:11b": "30m",
+    "llama3.1:8b": "30m",
+}
+
+# Başlangıçta modelleri ısıtma. wsgi.py / asgi.py bunu varsayılan olarak açar (gunicorn, uvicorn
+# vb.); testler ve yönetim komutları için kapalıdır. Geliştirme sunucusunda açmak için:
+#   OLLAMA_WARMUP_ON_STARTUP=1 python manage.py runserver
+# Kapatmak için ortamda OLLAMA_WARMUP_ON_STARTUP=0 verilir.
+OLLAMA_WARMUP_ON_STARTUP = os.getenv('OLLAMA_WARMUP_ON_STARTUP', '0').lower() in ('1', 'true', 'yes')
+
+OLLAMA_WARMUP_REFRESH_SECONDS = 60
+
+# Tüm modeller aynı anda belleğe sığıyorsa True. False iken (bellek kısıtlı sunucu) başlangıçta
+# sadece ilk model ısıtılır ve bellekten düşen modeller arka planda yeniden yüklenmez; aksi halde
+# modeller birbirini sürekli atar. İki modelin de başlangıçta ısıtılması için
+# OLLAMA_MODELS_FIT_TOGETHER=1 verilmelidir (GPU belleği ikisine yetiyorsa).
+OLLAMA_MODELS_FIT_TOGETHER = os.getenv('OLLAMA_MODELS_FIT_TOGETHER', '0').lower() in ('1', 'true', 'yes')
+
+
+# Prompt token budgeting
+# Her model için tek bir num_ctx kullanılır (ısıtma dahil); num_ctx değiştiğinde Ollama modeli
+# yeniden yükler. Değer modelin en büyük beklenen prompt'u ve yanıtına göre seçilir; istek
+# başına sadece num_predict değişir.
+
+OLLAMA_NUM_CTX = {
+    "llama3.2-vision:11b": 4096,
+    "llama3.1:8b": 6144,
+}
+
+PROMPT_REFERENCE_MAX_TOKENS = 1500
+
+PROMPT_CRITERIA_MAX_TOKENS = 1000
+
+PROMPT_QUESTION_MAX_TOKENS = 500
+
+# Öğrenci cevabı sabit bir sınırla değil, bu bloklardan sonra num_ctx'te kalan bütçeyle kısaltılır;
+# prompt yine de sığmıyorsa istek PromptBudgetError ile reddedilir.
+
+
+# Upload ingestion
+# FILE_UPLOAD_MAX_MEMORY_SIZE üzerindeki dosyalar bellekte tutulmaz, geçici dosyaya yazılır.
+# UploadSizeLimitHandler, istek UPLOAD_MAX_SIZE'ı aştığı anda yüklemeyi keser.
+
+FILE_UPLOAD_MAX_MEMORY_SIZE = 1 * 1024 * 1024
+
+FILE_UPLOAD_HANDLERS = [
+    "sinavokuyucu.uploads.UploadSizeLimitHandler",
+    "django.core.files.uploadhandler.MemoryFileUploadHandler",
+    "django.core.files.uploadhandler.TemporaryFileUploadHandler",
+]
+
+UPLOAD_MAX_SIZE = 200 * 1024 * 1024  # Toplu tarama (PDF / zip) dahil tüm istekler
+
+UPLOAD_MAX_IMAGE_SIZE = 20 * 1024 * 1024  # Tek resim yüklemeleri
+
+UPLOAD_MAX_CSV_SIZE = 10 * 1024 * 1024  # Çoklu metin cevap CSV'si (tamamı belleğe okunur)
+
+# Sınırı aşan bir yükleme kesildiğinde, Content-Length'i bu değeri aşmayan isteklerin kalan gövdesi
+# okunup atılır; böylece istemci 413 yanıtını alır. Daha büyük (ya da uzunluğu bilinmeyen) isteklerde
+# bağlantı kesilir; çoğu istemci bu durumda 413 yerine "connection reset" hatası görür.
+UPLOAD_DRAIN_MAX_SIZE = 250 * 1024 * 1024
@@ -1,3 +1,16 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import ExamTemplate, GradedResult
+
+
+@admin.register(ExamTemplate)
+class ExamTemplateAdmin(admin.ModelAdmin):
+    list_display = ("name", "created_at", "updated_at")
+    search_fields = ("name",)
+
+
+@admin.register(GradedResult)
+class GradedResultAdmin(admin.ModelAdmin):
+    list_display = ("exam", "question", "student", "grade_label", "source", "created_at")
+    list_filter = ("source", "exam")
+    search_fields = ("exam", "question", "student")
@@ -1,6 +1,15 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class SinavokuyucuConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
-    name = "sinavokuyucu"
\ No newline at end of file
+    name = "sinavokuyucu"
+
+    def ready(self):
+        # Modeller sadece açıkça istenen süreçlerde (sunucu) ısıtılır; testler, betikler ve
+        # yönetim komutları Ollama'ya istek atmaz.
+        if not getattr(settings, 'OLLAMA_WARMUP_ON_STARTUP', False):
+            return
+        from .model_manager import model_manager
+        model_manager.start()
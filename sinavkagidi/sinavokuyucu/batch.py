@@ -0,0 +1,226 @@
+import os
+import queue
+import threading
+import traceback
+import zipfile
+
+import numpy as np
+
+from . import omr
+from .uploads import upload_limit
+
+# --- Ayarlar ---
+PDF_RENDER_DPI = 200
+STAGE_QUEUE_SIZE = 2  # Aşamalar arası kuyruk boyutu; bellekte aynı anda tutulan sayfa sayısını sınırlar.
+UNBOUNDED = 0  # Sadece metin taşıyan (resmi bırakılmış) sayfaların kuyruğu için
+QUEUE_POLL_SECONDS = 0.5  # İş parçacıklarının durdurma isteğini kontrol etme aralığı
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff', '.webp')
+
+_DONE = object()
+
+
+class BatchInputError(Exception):
+    pass
+
+
+class PageItem:
+    """Pipeline boyunca taşınan tek bir sayfanın durumu."""
+
+    def __init__(self, index, source, student, page):
+        self.index = index
+        self.source = source
+        self.student = student
+        self.page = page
+        self.image = None
+        self.data = {}
+        self.error = None
+        self.timings_ms = {}
+
+
+# --- Sayfa kaynakları (decode / rasterize) ---
+
+def iter_pdf_pages(uploaded_file, dpi=PDF_RENDER_DPI):
+    """PDF sayfalarını tek tek gri tonlamalı görüntüye çevirerek döndürür."""
+    try:
+        import pymupdf
+    except ImportError:
+        raise BatchInputError("PDF desteği için PyMuPDF kurulu olmalı (pip install PyMuPDF).")
+
+    try:
+        if hasattr(uploaded_file, 'temporary_file_path'):
+            document = pymupdf.open(uploaded_file.temporary_file_path(), filetype='pdf')
+        else:
+            document = pymupdf.open(stream=uploaded_file.read(), filetype='pdf')
+    except pymupdf.FileDataError:
+        raise BatchInputError("PDF dosyası okunamadı.")
+    with document:
+        for page_number, page in enumerate(document, start=1):
+            pixmap = page.get_pixmap(dpi=dpi, colorspace=pymupdf.csGRAY)
+            image = np.frombuffer(pixmap.samples, dtype=np.uint8).reshape(pixmap.height, pixmap.stride)
+            yield f"sayfa-{page_number}", image[:, :pixmap.width].copy()
+
+
+def iter_zip_images(uploaded_file, max_entry_size=None):
+    """
+    Zip içindeki resimleri, tüm arşivi belleğe almadan sırayla çözerek döndürür.
+    Açılmış boyutu `max_entry_size`'ı (varsayılan UPLOAD_MAX_IMAGE_SIZE) aşan dosyalar atlanır.
+    """
+    if max_entry_size is None:
+        max_entry_size = upload_limit('UPLOAD_MAX_IMAGE_SIZE', 20 * 1024 * 1024)
+    try:
+        archive = zipfile.ZipFile(uploaded_file)
+    except zipfile.BadZipFile:
+        raise BatchInputError("Zip dosyası okunamadı.")
+    with archive:
+        entries = sorted(
+            (info for info in archive.infolist()
+             if not info.is_dir() and info.filename.lower().endswith(IMAGE_EXTENSIONS)
+             and not os.path.basename(info.filename).startswith('.')),
+            key=lambda info: info.filename,
+        )
+        for info in entries:
+            name = info.filename
+            if info.file_size > max_entry_size:
+                print(f"UYARI: Zip içindeki '{name}' resmi çok büyük ({info.file_size} bayt), atlanıyor.")
+                continue
+            with archive.open(info) as f:
+                try:
+                    # Başlıktaki boyut yanlış olsa bile sınırdan fazlası okunmaz.
+                    data = f.read(max_entry_size + 1)
+                    if len(data) > max_entry_size:
+                        raise ValueError("boyut sınırı aşıldı")
+                    image = omr.decode_image(data)
+                except (ValueError, zipfile.BadZipFile):
+                    print(f"UYARI: Zip içindeki '{name}' resmi okunamadı, atlanıyor.")
+                    continue
+            yield name, image
+
+
+def iter_batch_pages(uploaded_file, students=None, pages_per_student=1):
+    """
+    Yüklenen PDF veya zip dosyasındaki sayfaları öğrenci ve sayfa numarasıyla eşleştirerek döndürür.
+
+    Zip içinde klasör kullanılmışsa ("ali/1.jpg") klasör adı öğrenci kabul edilir; aksi halde
+    sayfalar sırayla `pages_per_student` adet olacak şekilde `students` listesine dağıtılır.
+    """
+    name = (uploaded_file.name or '').lower()
+    if name.endswith('.pdf'):
+        pages = iter_pdf_pages(uploaded_file)
+    elif name.endswith('.zip'):
+        pages = iter_zip_images(uploaded_file)
+    else:
+        raise BatchInputError("Sadece PDF veya zip dosyası yüklenebilir.")
+
+    students = students or []
+    page_counts = {}
+    for index, (source, image) in enumerate(pages):
+        folder = os.path.dirname(source)
+        if folder:
+            student = folder.replace('\\', '/').split('/')[-1]
+        else:
+            student_index = index // pages_per_student
+            student = students[student_index] if student_index < len(students) else f"ogrenci-{student_index + 1}"
+        page_counts[student] = page_counts.get(student, 0) + 1
+
+        item = PageItem(index, source, student, page_counts[student])
+        item.image = image
+        yield item
+
+
+# --- Pipeline ---
+
+def _put(q, item, stop):
+    """Kuyruğa ekler; pipeline durdurulduysa False döndürür."""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=QUEUE_POLL_SECONDS)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _get(q, stop):
+    """Kuyruktan alır; pipeline durdurulduysa _DONE döndürür."""
+    while not stop.is_set():
+        try:
+            return q.get(timeout=QUEUE_POLL_SECONDS)
+        except queue.Empty:
+            continue
+    return _DONE
+
+
+def _run_stage(name, func, inbox, outbox, stop):
+    while True:
+        item = _get(inbox, stop)
+        if item is _DONE:
+            _put(outbox, _DONE, stop)
+            return
+        if item.error is None:
+            try:
+                func(item)
+            except Exception as e:
+                print(f"HATA: {item.source} sayfası '{name}' aşamasında başarısız oldu. Hata: {e}")
+                traceback.print_exc()
+                item.error = f"{name}: {e}"
+        if not _put(outbox, item, stop):
+            return
+
+
+def run_pipeline(pages, stages, queue_size=STAGE_QUEUE_SIZE):
+    """
+    Sayfaları sınırlı kuyruklarla bağlanmış aşamalardan geçirir; her aşama kendi iş
+    parçacığında çalışır. Böylece N. sayfa çözülürken N-1. sayfa ön işlenir, N-2. sayfa
+    OCR'dan ve N-3. sayfa notlandırmadan geçer.
+
+    `stages`, (ad, fonksiyon) ya da (ad, fonksiyon, çıkış_kuyruğu_boyutu) öğelerinden oluşan
+    bir listedir; fonksiyon PageItem'ı yerinde günceller. Çıkış kuyruğu boyutu verilmezse
+    `queue_size` kullanılır; UNBOUNDED (0) sınırsızdır. Resmi bırakan aşamalardan (ör. OCR)
+    sonra sınırsız kuyruk kullanmak, bir modelin işlerinin diğer modele geçmeden bitmesini
+    sağlar. Hata veren sayfa sonraki aşamaları atlar ve hatasıyla birlikte döner.
+    Tamamlanan sayfalar geldikleri sırayla üretilir. Tüketici erken durursa (hata ya da
+    generator'ın kapatılması) tüm iş parçacıklarına durma sinyali gönderilir.
+    """
+    stop = threading.Event()
+    output_sizes = [stage[2] if len(stage) > 2 else queue_size for stage in stages]
+    queues = [queue.Queue(maxsize=size) for size in [queue_size] + output_sizes]
+    threads = [
+        threading.Thread(target=_run_stage, args=(stage[0], stage[1], queues[i], queues[i + 1], stop), daemon=True)
+        for i, stage in enumerate(stages)
+    ]
+    for thread in threads:
+        thread.start()
+
+    source_error = []
+
+    def feed():
+        try:
+            for item in pages:
+                if not _put(queues[0], item, stop):
+                    break
+        except Exception as e:
+            source_error.append(e)
+        finally:
+            if hasattr(pages, 'close'):
+                pages.close()
+            _put(queues[0], _DONE, stop)
+
+    feeder = threading.Thread(target=feed, daemon=True)
+    feeder.start()
+
+    try:
+        while True:
+            item = queues[-1].get()
+            if item is _DONE:
+                break
+            yield item
+    finally:
+        # Erken çıkışta kuyrukta bekleyen iş parçacıkları bu sinyalle serbest kalır; o an
+        # çalışan aşama (ör. bir Ollama isteği) bitince kendiliğinden çıkar, beklenmez.
+        stop.set()
+
+    feeder.join()
+    for thread in threads:
+        thread.join()
+    if source_error:
+        raise source_error[0]
@@ -0,0 +1,256 @@
+import json
+import re
+import threading
+
+from .model_manager import ollama_chat
+
+# --- Şemalar (Ollama structured output 'format' parametresi) ---
+GRADING_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "grade": {"type": "number"},
+        "reason": {"type": "string"},
+    },
+    "required": ["grade", "reason"],
+}
+
+# Ollama'ya en üstte nesne veriyoruz; 'items' dizisi çağıran tarafa liste olarak döndürülür.
+STRUCTURING_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "items": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "question": {"type": "string"},
+                    "answer": {"type": "string"},
+                },
+                "required": ["question", "answer"],
+            },
+        },
+    },
+    "required": ["items"],
+}
+
+RETRY_PROMPT = (
+    "Your previous response could not be parsed as JSON. Respond again with ONLY a single valid "
+    "JSON value that matches the requested schema. No Markdown, no explanations."
+)
+
+_OPENING_FENCE_RE = re.compile(r"^```(?:json)?[ \t]*\n?", re.IGNORECASE)
+_CLOSING_FENCE_RE = re.compile(r"\s*```\s*$")
+
+
+class LLMJSONError(Exception):
+    def __init__(self, message, raw_output):
+        super().__init__(message)
+        self.raw_output = raw_output
+
+
+# --- Metrikler ---
+
+class ParseMetrics:
+    """Model çıktısının JSON olarak çözümlenme istatistiklerini tutar (iş parçacığı güvenli)."""
+
+    OUTCOMES = ("direct", "repaired", "retried", "failed")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {}
+
+    def record(self, kind, outcome):
+        with self._lock:
+            counts = self._counts.setdefault(kind, dict.fromkeys(self.OUTCOMES, 0))
+            counts[outcome] += 1
+
+    def snapshot(self):
+        with self._lock:
+            result = {}
+            for kind, counts in self._counts.items():
+                total = sum(counts.values())
+                result[kind] = dict(
+                    counts,
+                    total=total,
+                    failure_rate=round(counts["failed"] / total, 4) if total else 0.0,
+                    retry_rate=round(counts["retried"] / total, 4) if total else 0.0,
+                )
+            return result
+
+    def reset(self):
+        with self._lock:
+            self._counts.clear()
+
+
+parse_metrics = ParseMetrics()
+
+
+# --- Toleranslı ayrıştırıcı ---
+
+def _repair_truncated(text):
+    """
+    Yarıda kesilmiş bir JSON metnini kapatmaya çalışır: açık kalan string'i kapatır,
+    sondaki virgülü / yarım anahtarı atar ve açık parantezleri sırayla kapatır.
+    """
+    stack = []
+    in_string = False
+    escaped = False
+    last_safe = 0  # Bir değerin tamamlandığı son konum
+    for i, ch in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == '\\':
+                escaped = True
+            elif ch == '"':
+                in_string = False
+                last_safe = i + 1
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in '{[':
+            stack.append('}' if ch == '{' else ']')
+        elif ch in '}]':
+            if not stack:
+                return None
+            stack.pop()
+            last_safe = i + 1
+        elif not ch.isspace() and ch not in ',:':
+            last_safe = i + 1
+
+    repaired = text
+    if in_string:
+        repaired += '"'
+    elif escaped:
+        return None
+    else:
+        repaired = text[:last_safe]
+    repaired = repaired.rstrip().rstrip(',')
+    # Nesne içinde tek başına kalmış bir anahtar ({"a": 1, "rea) ise at.
+    if stack and stack[-1] == '}':
+        repaired = re.sub(r',\s*"[^"]*"\s*$', '', repaired)
+        repaired = re.sub(r'\{\s*"[^"]*"\s*$', '{', repaired)
+    return repaired + ''.join(reversed(stack))
+
+
+def parse_json_output(text):
+    """
+    Model çıktısından ilk JSON değerini çözümler. Markdown kod bloklarını ve metin
+    içindeki fazlalıkları tolere eder, yarıda kesilmiş çıktıyı onarmayı dener.
+
+    (değer, onarıldı_mı) döndürür; çözümlenemezse ValueError fırlatır.
+    """
+    text = (text or '').strip()
+    try:
+        return json.loads(text), False
+    except json.JSONDecodeError:
+        pass
+
+    # Yalnızca metin bir kod bloğuyla başlıyorsa açılış satırı atılır. Kapanış ``` işaretine
+    # göre kesilmez; JSON'un içinde (ör. 'reason' alanında) ``` geçebilir. JSON'dan sonra
+    # gelen kapanış işaretini raw_decode zaten yok sayar.
+    text = _OPENING_FENCE_RE.sub('', text, count=1)
+
+    starts = [i for i in (text.find('{'), text.find('[')) if i != -1]
+    if not starts:
+        raise ValueError("Yanıtta JSON değeri bulunamadı.")
+    text = text[min(starts):]
+
+    # raw_decode ilk tam JSON değerinde durur; arkasından gelen metni yok sayar.
+    try:
+        return json.JSONDecoder().raw_decode(text)[0], True
+    except json.JSONDecodeError:
+        pass
+
+    repaired = _repair_truncated(_CLOSING_FENCE_RE.sub('', text))
+    if repaired is not None:
+        try:
+            return json.loads(repaired), True
+        except json.JSONDecodeError:
+            pass
+    raise ValueError("JSON onarılamadı.")
+
+
+_LEAF_TYPES = {
+    "string": lambda v: isinstance(v, str),
+    "number": lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+    "integer": lambda v: isinstance(v, int) and not isinstance(v, bool),
+    "boolean": lambda v: isinstance(v, bool),
+}
+
+
+def _matches_schema(value, schema):
+    """Değerin şemadaki tiplere (iç içe nesne/dizi ve yaprak tipler dahil) ve zorunlu anahtarlara uyduğunu kontrol eder."""
+    expected = schema.get("type")
+    if expected == "object":
+        if not isinstance(value, dict):
+            return False
+        if any(key not in value for key in schema.get("required", [])):
+            return False
+        return all(
+            _matches_schema(value[key], sub) for key, sub in schema.get("properties", {}).items()
+            if key in value
+        )
+    if expected == "array":
+        return isinstance(value, list) and all(_matches_schema(v, schema.get("items", {})) for v in value)
+    check = _LEAF_TYPES.get(expected)
+    return check is None or check(value)
+
+
+def _coerce(value, list_key=None):
+    """
+    Şemaya uymayan ama onarılabilen çıktıyı düzeltir: `list_key` verilmişse ve model
+    nesne yerine doğrudan dizi döndürdüyse dizi {list_key: dizi} içine alınır.
+    """
+    if list_key and isinstance(value, list):
+        return {list_key: value}
+    return value
+
+
+def request_json(payload, schema, kind, timeout, stats=None, list_key=None):
+    """
+    Ollama'dan şemaya uygun JSON ister ve çözümlenmiş değeri döndürür.
+
+    Çıktı önce doğrudan, sonra onarılarak çözümlenir; ikisi de başarısız olursa model
+    hatalı yanıtıyla birlikte bir kez daha çağrılır. Yine olmazsa LLMJSONError fırlatır.
+    `stats` verilirse son denemede Ollama'nın bildirdiği gerçek token sayıları
+    (prompt_eval_count, eval_count) ve deneme sayısı (attempts) içine yazılır. `list_key`, şemanın diziyi sardığı anahtardır (bkz. _coerce).
+    """
+    payload = dict(payload, format=schema)
+    messages = list(payload["messages"])
+
+    raw_output = ''
+    for attempt in range(2):
+        payload["messages"] = messages
+        response = ollama_chat(payload, timeout=timeout)
+        response.raise_for_status()
+        llm_output = response.json()
+        raw_output = llm_output.get('message', {}).get('content', '')
+        if stats is not None:
+            # Yeniden denemede prompt önceki yanıtı da içerir; toplamak boyutu iki kez sayar.
+            # Sadece son denemenin sayıları yazılır, deneme sayısı ayrıca tutulur.
+            for key in ('prompt_eval_count', 'eval_count'):
+                stats[key] = llm_output.get(key, 0)
+            stats['attempts'] = attempt + 1
+        print(f"ADIM BAŞARILI: {payload['model']} modelinden dönen ham yanıt: {raw_output}")
+        try:
+            value, repaired = parse_json_output(raw_output)
+            value = _coerce(value, list_key)
+            if not _matches_schema(value, schema):
+                raise ValueError("Yanıt şemaya uymuyor.")
+        except ValueError as e:
+            print(f"UYARI: {kind} yanıtı çözümlenemedi ({e}).")
+            messages = messages + [
+                {"role": "assistant", "content": raw_output},
+                {"role": "user", "content": RETRY_PROMPT},
+            ]
+            continue
+
+        if attempt:
+            parse_metrics.record(kind, "retried")
+        else:
+            parse_metrics.record(kind, "repaired" if repaired else "direct")
+        return value
+
+    parse_metrics.record(kind, "failed")
+    raise LLMJSONError(f"{kind} yanıtı JSON olarak çözümlenemedi.", raw_output)
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.5 on 2026-10-19 15:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sinavokuyucu', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GradedResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('exam', models.CharField(blank=True, default='', max_length=200)),
+                ('question', models.CharField(max_length=500)),
+                ('student', models.CharField(blank=True, default='', max_length=200)),
+                ('student_answer', models.TextField(blank=True, default='')),
+                ('grade', models.FloatField(blank=True, null=True)),
+                ('grade_label', models.CharField(blank=True, default='', max_length=100)),
+                ('reason', models.TextField(blank=True, default='')),
+                ('source', models.CharField(choices=[('image', 'El yazısı resim'), ('text', 'Metin'), ('csv', 'CSV'), ('template', 'Şablon'), ('batch', 'Toplu tarama')], max_length=20)),
+                ('processing_time_ms', models.FloatField(blank=True, null=True)),
+                ('prompt_tokens', models.PositiveIntegerField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-created_at', '-id'],
+                'indexes': [models.Index(fields=['exam', 'question'], name='sinavokuyuc_exam_a9663a_idx'), models.Index(fields=['exam', 'student'], name='sinavokuyuc_exam_09f410_idx'), models.Index(fields=['question'], name='sinavokuyuc_questio_e3a5b1_idx'), models.Index(fields=['student'], name='sinavokuyuc_student_11bdce_idx'), models.Index(fields=['grade'], name='sinavokuyuc_grade_dd306a_idx'), models.Index(fields=['-created_at', '-id'], name='sinavokuyuc_created_8a3414_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.5 on 2026-10-19 16:20
+
+import hashlib
+
+from django.db import migrations, models
+
+
+def fill_question_keys(apps, schema_editor):
+    GradedResult = apps.get_model('sinavokuyucu', 'GradedResult')
+    for result in GradedResult.objects.only('id', 'question').iterator():
+        result.question_key = hashlib.sha256(result.question.encode('utf-8')).hexdigest()
+        result.save(update_fields=['question_key'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sinavokuyucu', '0002_graded_result'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='gradedresult',
+            name='sinavokuyuc_exam_a9663a_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='gradedresult',
+            name='sinavokuyuc_questio_e3a5b1_idx',
+        ),
+        migrations.AddField(
+            model_name='gradedresult',
+            name='question_key',
+            field=models.CharField(default='', editable=False, max_length=64),
+        ),
+        migrations.AlterField(
+            model_name='gradedresult',
+            name='question',
+            field=models.TextField(),
+        ),
+        migrations.RunPython(fill_question_keys, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='gradedresult',
+            index=models.Index(fields=['exam', 'question_key'], name='sinavokuyuc_exam_4c45fb_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='gradedresult',
+            index=models.Index(fields=['question_key'], name='sinavokuyuc_questio_355359_idx'),
+        ),
+    ]
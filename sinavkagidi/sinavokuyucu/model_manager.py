@@ -0,0 +1,266 @@
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+import requests
+from django.conf import settings
+
+from .uploads import request_body_kwargs
+
+# --- Ayarlar ---
+OLLAMA_BASE_URL = getattr(settings, 'OLLAMA_BASE_URL', "http://localhost:11434")
+OLLAMA_API_URL = f"{OLLAMA_BASE_URL}/api/chat"
+VISION_MODEL_NAME = "llama3.2-vision:11b"
+TEXT_MODEL_NAME = "llama3.1:8b"
+
+# Modelin bellekte ne kadar tutulacağı (Ollama 'keep_alive' formatında, örn. "30m", "-1").
+DEFAULT_KEEP_ALIVE = {
+    VISION_MODEL_NAME: "30m",
+    TEXT_MODEL_NAME: "30m",
+}
+
+# Model başına sabit bağlam penceresi (num_ctx). Ollama num_ctx değiştiğinde modeli yeniden
+# yüklediğinden her model tüm isteklerde (ısıtma dahil) aynı değerle çağrılır. Değerler,
+# modelin en büyük beklenen prompt'u + yanıt payına göre seçilmiştir (bkz. prompt_budget).
+DEFAULT_NUM_CTX = {
+    VISION_MODEL_NAME: 4096,  # resim (~1600) + OCR yanıtı (1024)
+    TEXT_MODEL_NAME: 6144,    # referans (1500) + kriter (1000) + soru/cevap + yanıt (400)
+}
+
+
+_DURATION_UNITS = {"ns": 1e-9, "us": 1e-6, "µs": 1e-6, "ms": 0.001, "s": 1, "m": 60, "h": 3600}
+_DURATION_PART_RE = re.compile(r"(\d+(?:\.\d+)?)(ns|us|µs|ms|s|m|h)")
+
+
+def keep_alive_seconds(value):
+    """
+    Ollama 'keep_alive' değerini saniyeye çevirir; negatif değer süresiz demektir.
+    Düz sayıları (saniye) ve Go süre biçimini ("30m", "1h30m", "1.5h") kabul eder;
+    geçersiz değerde ValueError fırlatır.
+    """
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = str(value).strip().lower()
+    try:
+        return float(text)
+    except ValueError:
+        pass
+    sign = -1 if text.startswith('-') else 1
+    body = text.lstrip('+-')
+    parts = _DURATION_PART_RE.findall(body)
+    if not body or ''.join(number + unit for number, unit in parts) != body:
+        raise ValueError(f"Geçersiz keep_alive süresi: {value!r}")
+    return sign * sum(float(number) * _DURATION_UNITS[unit] for number, unit in parts)
+
+
+class ModelResidencyManager:
+    """
+    Ollama modellerini ısıtır (warm-up), bellekte tutar ve işleri model bazında sıraya koyar.
+
+    Aynı anda yalnızca bir model "aktif" olabilir. Aktif model için bekleyen iş kaldığı
+    sürece diğer modelin işleri bekletilir; böylece bir batch'in OCR adımları bitmeden
+    notlandırma modeline geçilmez ve modeller birbirini bellekten atmaz. Geçiş gerektiğinde
+    bellekte yüklü olan modelin bekleyen işleri önce alınır.
+    """
+
+    def __init__(self, base_url=OLLAMA_BASE_URL, keep_alive=None, refresh_interval=60, max_consecutive=16,
+                 models_fit_together=False, num_ctx=None):
+        self.base_url = base_url
+        self.keep_alive = dict(DEFAULT_KEEP_ALIVE)
+        self.keep_alive.update(keep_alive or {})
+        self.num_ctx = dict(DEFAULT_NUM_CTX)
+        self.num_ctx.update(num_ctx or {})
+        self.refresh_interval = refresh_interval
+        # Diğer model beklerken aktif modelin arka arkaya alabileceği en fazla iş (açlığı önler).
+        self.max_consecutive = max_consecutive
+        # False ise bir modele geçildiğinde diğerlerinin bellekten düştüğü varsayılır.
+        self.models_fit_together = models_fit_together
+
+        self.resident = set()
+        self._last_used = {}
+        self._cond = threading.Condition()
+        self._active_model = None
+        self._running = 0
+        self._consecutive = 0
+        self._waiting = {}
+        self._thread = None
+        self._stop = threading.Event()
+
+    # --- Bellek durumu ---
+
+    def keep_alive_for(self, model):
+        return self.keep_alive.get(model, "5m")
+
+    def options_for(self, model):
+        """Modelin yüklenme parametrelerini belirleyen sabit Ollama 'options' değerleri."""
+        if model in self.num_ctx:
+            return {"num_ctx": self.num_ctx[model]}
+        return {}
+
+    def refresh_resident(self):
+        """Ollama'dan (/api/ps) bellekte yüklü modelleri okur."""
+        try:
+            response = requests.get(f"{self.base_url}/api/ps", timeout=5)
+            response.raise_for_status()
+            models = response.json().get('models', [])
+            with self._cond:
+                self.resident = {m.get('name') or m.get('model') for m in models}
+                self._cond.notify_all()
+        except requests.exceptions.RequestException as e:
+            print(f"UYARI: Yüklü modeller okunamadı. Hata: {e}")
+        return self.resident
+
+    def warm_up(self, model):
+        """
+        Boş bir istekle modeli belleğe yükler ve keep_alive süresini ayarlar. İstek diğer
+        işlerle aynı sıraya girer; böylece çalışan bir işin modelini bellekten atmaz.
+        """
+        print(f"BİLGİ: {model} modeli ısıtılıyor (keep_alive={self.keep_alive_for(model)})...")
+        start_time = time.time()
+        # Isıtma, gerçek isteklerle aynı num_ctx ile yapılır; aksi halde ilk istek modeli yeniden yükler.
+        payload = {"model": model, "keep_alive": self.keep_alive_for(model), "options": self.options_for(model)}
+        try:
+            with self.use(model):
+                response = requests.post(f"{self.base_url}/api/generate", json=payload, timeout=120)
+                response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            print(f"UYARI: {model} modeli ısıtılamadı. Hata: {e}")
+            return False
+        print(f"BİLGİ: {model} modeli hazır ({(time.time() - start_time) * 1000:.2f} ms).")
+        return True
+
+    def warm_up_all(self):
+        """
+        Modelleri ısıtır. Modeller birlikte belleğe sığmıyorsa sadece ilk model ısıtılır;
+        sırayla ısıtmak bir öncekini bellekten atmaktan başka işe yaramaz.
+        """
+        models = list(self.keep_alive)
+        if not self.models_fit_together:
+            models = models[:1]
+        for model in models:
+            self.warm_up(model)
+
+    def _should_rewarm(self, model, now):
+        """
+        Model bellekten, keep_alive süresi dolmadan düşmüşse yeniden ısıtılır. Süresi
+        dolarak düşen model yüklenmez; aksi halde keep_alive ayarı anlamını yitirir.
+        """
+        if model in self.resident:
+            return False
+        try:
+            keep_alive = keep_alive_seconds(self.keep_alive_for(model))
+        except ValueError as e:
+            print(f"UYARI: {model} için keep_alive okunamadı, yeniden ısıtma atlanıyor. Hata: {e}")
+            return False
+        if keep_alive < 0:
+            return True
+        last_used = self._last_used.get(model)
+        return last_used is not None and now - last_used < keep_alive
+
+    # --- Arka plan ---
+
+    def start(self):
+        """Arka planda modelleri ısıtır ve belirli aralıklarla bellekte kalmalarını sağlar."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="ollama-warmup", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        self.warm_up_all()
+        while not self._stop.wait(self.refresh_interval):
+            # Tek bir hatalı tur arka plan iş parçacığını sessizce öldürmesin.
+            try:
+                self._refresh_once()
+            except Exception as e:
+                print(f"UYARI: Model bellek kontrolü başarısız oldu. Hata: {e}")
+
+    def _refresh_once(self):
+        self.refresh_resident()
+        # Bellek kısıtlı sunucuda yeniden ısıtma diğer modeli atar; sadece izlenir.
+        if not self.models_fit_together:
+            return
+        for model in self.keep_alive:
+            with self._cond:
+                idle = self._running == 0 and not any(self._waiting.values())
+                rewarm = idle and self._should_rewarm(model, time.time())
+            if rewarm:
+                self.warm_up(model)
+
+    # --- İş sıralama ---
+
+    def _can_enter(self, model):
+        if self._active_model == model:
+            others_waiting = any(n for m, n in self._waiting.items() if m != model)
+            return not others_waiting or self._consecutive < self.max_consecutive
+        if self._running > 0:
+            return False
+        if self._active_model is not None and self._waiting.get(self._active_model):
+            # Aktif modelin bekleyen işleri bitmeden geçiş yapılmaz (açlık sınırı dolmadıysa).
+            return self._consecutive >= self.max_consecutive
+        # Geçiş: bellekte yüklü bir modelin bekleyen işi varsa, yüklü olmayan model onu bekler.
+        if model not in self.resident:
+            return not any(n for m, n in self._waiting.items() if n and m != model and m in self.resident)
+        return True
+
+    @contextmanager
+    def use(self, model):
+        """
+        Verilen modeli kullanan bir işi sıraya sokar.
+
+        Kullanım:
+            with model_manager.use(VISION_MODEL_NAME):
+                requests.post(...)
+        """
+        with self._cond:
+            self._waiting[model] = self._waiting.get(model, 0) + 1
+            while not self._can_enter(model):
+                self._cond.wait()
+            self._waiting[model] -= 1
+            if self._active_model != model:
+                if self._active_model is not None:
+                    print(f"BİLGİ: Model geçişi: {self._active_model} -> {model}")
+                self._active_model = model
+                self._consecutive = 0
+            self._running += 1
+            self._consecutive += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._running -= 1
+                if self.models_fit_together:
+                    self.resident.add(model)
+                else:
+                    self.resident = {model}
+                self._last_used[model] = time.time()
+                if self._running == 0 and not any(self._waiting.values()):
+                    self._active_model = None
+                    self._consecutive = 0
+                self._cond.notify_all()
+
+
+model_manager = ModelResidencyManager(
+    keep_alive=getattr(settings, 'OLLAMA_KEEP_ALIVE', None),
+    refresh_interval=getattr(settings, 'OLLAMA_WARMUP_REFRESH_SECONDS', 60),
+    models_fit_together=getattr(settings, 'OLLAMA_MODELS_FIT_TOGETHER', False),
+    num_ctx=getattr(settings, 'OLLAMA_NUM_CTX', None),
+)
+
+
+def ollama_chat(payload, timeout):
+    """
+    Ollama /api/chat isteğini model sırasına uyarak gönderir; modelin keep_alive süresini
+    ve sabit num_ctx değerini isteğe ekler. Mesajlardaki StreamedImage resimleri gövdeye
+    akış olarak yazılır. Yanıt nesnesini döndürür.
+    """
+    model = payload["model"]
+    payload.setdefault("keep_alive", model_manager.keep_alive_for(model))
+    payload["options"] = dict(payload.get("options") or {}, **model_manager.options_for(model))
+    with model_manager.use(model):
+        return requests.post(OLLAMA_API_URL, timeout=timeout, **request_body_kwargs(payload))
@@ -1,3 +1,114 @@
+import hashlib
+
 from django.db import models
 
-# Create your models here.
+
+class ExamTemplate(models.Model):
+    """
+    Boş (doldurulmamış) bir sınav kağıdı şablonu.
+
+    `regions` alanı, şablon görüntüsünün piksel koordinatlarında cevap kutularını ve
+    çoktan seçmeli şıkları tanımlar:
+
+        {
+          "answer_boxes": [
+            {"id": "1", "question": "...", "reference_text": "...", "criteria": "...",
+             "box": [x, y, w, h]}
+          ],
+          "bubbles": [
+            {"id": "2", "correct": "B", "points": 5,
+             "options": {"A": [x, y, w, h], "B": [x, y, w, h]}}
+          ]
+        }
+    """
+    name = models.CharField(max_length=200, unique=True)
+    image = models.FileField(upload_to='exam_templates/')
+    regions = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.name
+
+
+class GradedResult(models.Model):
+    """
+    Notlandırılmış tek bir cevap. Listeleme, istatistik ve dışa aktarma bu tablodan yapılır.
+
+    `grade` sayısal nottur; model sayısal olmayan bir not döndürdüyse (ör. "JSON Hatası")
+    `grade` boş kalır ve değer `grade_label` alanında saklanır.
+
+    Soru metni kısaltılmadan saklanır; filtreleme ve soru başına gruplama, metnin SHA-256
+    özeti olan indeksli `question_key` alanı üzerinden yapılır.
+    """
+    SOURCE_IMAGE = "image"
+    SOURCE_TEXT = "text"
+    SOURCE_CSV = "csv"
+    SOURCE_TEMPLATE = "template"
+    SOURCE_BATCH = "batch"
+    SOURCE_CHOICES = [
+        (SOURCE_IMAGE, "El yazısı resim"),
+        (SOURCE_TEXT, "Metin"),
+        (SOURCE_CSV, "CSV"),
+        (SOURCE_TEMPLATE, "Şablon"),
+        (SOURCE_BATCH, "Toplu tarama"),
+    ]
+
+    exam = models.CharField(max_length=200, blank=True, default="")
+    question = models.TextField()
+    question_key = models.CharField(max_length=64, editable=False, default="")
+    student = models.CharField(max_length=200, blank=True, default="")
+    student_answer = models.TextField(blank=True, default="")
+    grade = models.FloatField(null=True, blank=True)
+    grade_label = models.CharField(max_length=100, blank=True, default="")
+    reason = models.TextField(blank=True, default="")
+    source = models.CharField(max_length=20, choices=SOURCE_CHOICES)
+    processing_time_ms = models.FloatField(null=True, blank=True)
+    prompt_tokens = models.PositiveIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-created_at", "-id"]
+        indexes = [
+            models.Index(fields=["exam", "question_key"]),
+            models.Index(fields=["exam", "student"]),
+            models.Index(fields=["question_key"]),
+            models.Index(fields=["student"]),
+            models.Index(fields=["grade"]),
+            models.Index(fields=["-created_at", "-id"]),
+        ]
+
+    def __str__(self):
+        return f"{self.exam or '-'} / {self.student or '-'}: {self.grade_label}"
+
+    @staticmethod
+    def make_question_key(question):
+        """Soru metninin SHA-256 özetini (64 karakter hex) döndürür."""
+        return hashlib.sha256((question or "").encode('utf-8')).hexdigest()
+
+    def save(self, *args, **kwargs):
+        self.question_key = self.make_question_key(self.question)
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def from_grading(cls, grading, question, student_answer="", exam="", student="", source=SOURCE_TEXT,
+                     processing_time_ms=None, prompt_tokens=None):
+        """get_llm_grading / OMR çıktısından kaydedilmemiş bir GradedResult oluşturur."""
+        raw_grade = grading.get('grade')
+        try:
+            grade = float(raw_grade)
+        except (TypeError, ValueError):
+            grade = None
+        return cls(
+            exam=(exam or "")[:200],
+            question=question or "",
+            question_key=cls.make_question_key(question),
+            student=(student or "")[:200],
+            student_answer=student_answer or "",
+            grade=grade,
+            grade_label=str(raw_grade if raw_grade is not None else "")[:100],
+            reason=str(grading.get('reason', '')),
+            source=source,
+            processing_time_ms=processing_time_ms,
+            prompt_tokens=prompt_tokens,
+        )
@@ -0,0 +1,160 @@
+import threading
+
+import cv2
+import numpy as np
+
+# --- Ayarlar ---
+ORB_FEATURES = 5000
+MATCH_KEEP_RATIO = 0.75  # Lowe oran testi
+MIN_MATCH_COUNT = 25
+BUBBLE_FILL_THRESHOLD = 0.25  # Boş şablona göre eklenen koyu piksel oranı bu değeri geçerse şık işaretli sayılır
+
+
+class TemplateAlignmentError(Exception):
+    pass
+
+
+def decode_image(image_bytes):
+    """Yüklenen resim baytlarını gri tonlamalı OpenCV görüntüsüne çevirir."""
+    array = np.frombuffer(image_bytes, dtype=np.uint8)
+    image = cv2.imdecode(array, cv2.IMREAD_GRAYSCALE)
+    if image is None:
+        raise ValueError("Resim dosyası çözümlenemedi.")
+    return image
+
+
+def encode_jpeg(image):
+    ok, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, 90])
+    if not ok:
+        raise ValueError("Resim JPEG olarak kodlanamadı.")
+    return buffer.tobytes()
+
+
+# Şablon anahtar noktaları her istekte yeniden hesaplanmasın diye bellekte tutulur.
+_feature_cache = {}
+_feature_cache_lock = threading.Lock()
+
+
+def template_features(template):
+    """Şablonun gri görüntüsünü ve ORB anahtar noktalarını döndürür (önbellekli)."""
+    cache_key = (template.pk, template.updated_at)
+    with _feature_cache_lock:
+        cached = _feature_cache.get(template.pk)
+        if cached and cached[0] == cache_key:
+            return cached[1]
+
+    with template.image.open('rb') as f:
+        image = decode_image(f.read())
+    orb = cv2.ORB_create(ORB_FEATURES)
+    keypoints, descriptors = orb.detectAndCompute(image, None)
+    features = (image, keypoints, descriptors)
+
+    with _feature_cache_lock:
+        _feature_cache[template.pk] = (cache_key, features)
+    return features
+
+
+def align_to_template(image, template):
+    """
+    Yüklenen sayfayı ORB eşleştirme ve homografi ile şablonun koordinat sistemine hizalar.
+    """
+    template_image, template_kp, template_desc = template_features(template)
+    orb = cv2.ORB_create(ORB_FEATURES)
+    keypoints, descriptors = orb.detectAndCompute(image, None)
+    if descriptors is None or template_desc is None:
+        raise TemplateAlignmentError("Görüntüde yeterli özellik noktası bulunamadı.")
+
+    matcher = cv2.BFMatcher(cv2.NORM_HAMMING)
+    good_matches = []
+    for pair in matcher.knnMatch(descriptors, template_desc, k=2):
+        if len(pair) == 2 and pair[0].distance < MATCH_KEEP_RATIO * pair[1].distance:
+            good_matches.append(pair[0])
+
+    if len(good_matches) < MIN_MATCH_COUNT:
+        raise TemplateAlignmentError(
+            f"Şablonla yeterli eşleşme bulunamadı ({len(good_matches)}/{MIN_MATCH_COUNT})."
+        )
+
+    src_points = np.float32([keypoints[m.queryIdx].pt for m in good_matches]).reshape(-1, 1, 2)
+    dst_points = np.float32([template_kp[m.trainIdx].pt for m in good_matches]).reshape(-1, 1, 2)
+    homography, _ = cv2.findHomography(src_points, dst_points, cv2.RANSAC, 5.0)
+    if homography is None:
+        raise TemplateAlignmentError("Homografi hesaplanamadı.")
+
+    height, width = template_image.shape[:2]
+    # Sayfa dışında kalan alanlar kağıt rengiyle (beyaz) doldurulur; sayfa eşiğini bozmasın.
+    return cv2.warpPerspective(image, homography, (width, height), borderValue=255)
+
+
+def crop_box(image, box):
+    x, y, w, h = (int(v) for v in box)
+    return image[max(y, 0):y + h, max(x, 0):x + w]
+
+
+def dark_cutoff(image):
+    """
+    Sayfanın tamamı üzerinde Otsu ile mürekkep/kağıt ayrım eşiğini hesaplar. Eşik kutu
+    bazında değil sayfa bazında seçilir; tamamen dolu bir kutuda Otsu koyu piksellerin
+    kendi gürültüsünü ikiye bölerdi.
+    """
+    cutoff, _ = cv2.threshold(image, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    return cutoff
+
+
+def dark_ratio(image, box, cutoff):
+    """Kutudaki eşikten koyu piksellerin oranını döndürür."""
+    region = crop_box(image, box)
+    if region.size == 0:
+        return 0.0
+    return float(np.count_nonzero(region < cutoff)) / region.size
+
+
+def bubble_fill_ratio(image, box, cutoff, blank_image=None, blank_cutoff=None):
+    """
+    Şık kutusunun işaretlenme oranını döndürür. Boş şablon verilirse şablondaki basılı
+    çerçevenin koyuluğu çıkarılır; sonuç öğrencinin eklediği mürekkebin oranıdır.
+    """
+    ratio = dark_ratio(image, box, cutoff)
+    if blank_image is not None:
+        ratio -= dark_ratio(blank_image, box, blank_cutoff if blank_cutoff is not None else cutoff)
+    return max(ratio, 0.0)
+
+
+def grade_bubbles(image, bubble, threshold=BUBBLE_FILL_THRESHOLD, cutoff=None, blank_image=None, blank_cutoff=None):
+    """Tek bir çoktan seçmeli soruyu model çağrısı olmadan piksel doluluğuna göre notlandırır."""
+    if cutoff is None:
+        cutoff = dark_cutoff(image)
+    fills = {
+        option: round(bubble_fill_ratio(image, box, cutoff, blank_image, blank_cutoff), 3)
+        for option, box in bubble.get('options', {}).items()
+    }
+    marked = [option for option, fill in fills.items() if fill >= threshold]
+    points = bubble.get('points', 1)
+    correct = bubble.get('correct')
+
+    if not marked:
+        grade, reason = 0, "Hiçbir şık işaretlenmemiş."
+    elif len(marked) > 1:
+        grade, reason = 0, f"Birden fazla şık işaretlenmiş: {', '.join(marked)}."
+    elif marked[0] == correct:
+        grade, reason = points, "Doğru şık işaretlenmiş."
+    else:
+        grade, reason = 0, f"Yanlış şık işaretlenmiş (doğru cevap: {correct})."
+
+    return {
+        "id": bubble.get('id'),
+        "marked": marked,
+        "fill_ratios": fills,
+        "grading": {"grade": grade, "reason": reason},
+    }
+
+
+def grade_page_bubbles(aligned, template):
+    """Şablona hizalanmış sayfadaki tüm şıkları, eşikleri sayfa başına bir kez hesaplayarak notlandırır."""
+    blank_image = template_features(template)[0]
+    cutoff = dark_cutoff(aligned)
+    blank_cutoff = dark_cutoff(blank_image)
+    return [
+        grade_bubbles(aligned, bubble, cutoff=cutoff, blank_image=blank_image, blank_cutoff=blank_cutoff)
+        for bubble in template.regions.get('bubbles', [])
+    ]
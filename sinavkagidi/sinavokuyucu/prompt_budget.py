@@ -0,0 +1,98 @@
+import re
+from functools import lru_cache
+
+from django.conf import settings
+
+from .model_manager import model_manager
+
+# --- Ayarlar ---
+# Llama tokenizer'ı Türkçe metinde token başına ~3 karakter üretir; tahmini bilerek
+# biraz yüksek tutuyoruz ki bağlam penceresi taşmasın.
+CHARS_PER_TOKEN = 3.0
+IMAGE_TOKENS = 1600  # llama3.2-vision'ın tek bir resim için ayırdığı yaklaşık token sayısı
+
+REFERENCE_MAX_TOKENS = getattr(settings, 'PROMPT_REFERENCE_MAX_TOKENS', 1500)
+CRITERIA_MAX_TOKENS = getattr(settings, 'PROMPT_CRITERIA_MAX_TOKENS', 1000)
+QUESTION_MAX_TOKENS = getattr(settings, 'PROMPT_QUESTION_MAX_TOKENS', 500)
+MIN_ANSWER_TOKENS = 100  # Öğrenci cevabına bundan az yer kalıyorsa notlandırma anlamsızdır
+
+GRADING_NUM_PREDICT = 400
+OCR_NUM_PREDICT = 1024
+STRUCTURING_MIN_PREDICT = 256
+
+TRIM_MARKER = "[...]"
+
+_SENTENCE_RE = re.compile(r'(?<=[.!?…])\s+|\n+')
+
+
+class PromptBudgetError(ValueError):
+    """Prompt ve yanıt payı, modelin sabit bağlam penceresine (num_ctx) sığmıyor."""
+
+
+def estimate_tokens(text):
+    """Metnin yaklaşık token sayısını tahmin eder (tokenizer çağırmadan)."""
+    if not text:
+        return 0
+    return int(len(text) / CHARS_PER_TOKEN) + 1
+
+
+@lru_cache(maxsize=256)
+def fit_block(text, max_tokens):
+    """
+    Referans metin veya kriter gibi soru başına tekrar eden uzun bir bloğu token bütçesine
+    sığdırır (bkz. trim_block). Aynı soru için sonuç önbellekten gelir.
+    """
+    return trim_block(text, max_tokens)
+
+
+def trim_block(text, max_tokens):
+    """
+    Metni token bütçesine sığacak şekilde kısaltır. Cümle sınırlarında keser, sonuna
+    TRIM_MARKER ekler. Öğrenci cevabı gibi her seferinde farklı metinler için önbelleksizdir.
+    """
+    if not text or estimate_tokens(text) <= max_tokens:
+        return text
+
+    budget = max_tokens - estimate_tokens(TRIM_MARKER)
+    kept = []
+    used = 0
+    for sentence in _SENTENCE_RE.split(text.strip()):
+        cost = estimate_tokens(sentence)
+        if used + cost > budget:
+            break
+        kept.append(sentence)
+        used += cost
+
+    if not kept:
+        # İlk cümle bile sığmıyorsa karakter bazında kes.
+        kept = [text[:int(budget * CHARS_PER_TOKEN)]]
+    trimmed = " ".join(kept) + " " + TRIM_MARKER
+    print(f"UYARI: Uzun blok {estimate_tokens(text)} -> {estimate_tokens(trimmed)} token'a kısaltıldı.")
+    return trimmed
+
+
+def remaining_tokens(model, prompt, num_predict, images=0):
+    """Prompt ve yanıt payından sonra modelin bağlam penceresinde kalan tahmini token sayısı."""
+    num_ctx = model_manager.options_for(model).get("num_ctx")
+    if not num_ctx:
+        return None
+    return num_ctx - num_predict - estimate_tokens(prompt) - images * IMAGE_TOKENS
+
+
+def context_options(model, prompt, num_predict, images=0):
+    """
+    Ollama 'options' değerlerini ve tahmini prompt token sayısını döndürür. num_ctx model
+    başına sabittir (model_manager.num_ctx); istekten isteğe sadece num_predict değişir.
+
+    Prompt + yanıt payı num_ctx'i aşıyorsa PromptBudgetError fırlatır; Ollama bu durumda
+    prompt'un başını (talimatlar ve referans) sessizce keserdi.
+    """
+    prompt_tokens = estimate_tokens(prompt) + images * IMAGE_TOKENS
+    options = dict(model_manager.options_for(model), num_predict=num_predict)
+    num_ctx = options.get("num_ctx")
+    if num_ctx and prompt_tokens + num_predict > num_ctx:
+        raise PromptBudgetError(
+            f"Prompt ({prompt_tokens} token) + yanıt ({num_predict}) {model} modelinin bağlam "
+            f"penceresini ({num_ctx}) aşıyor."
+        )
+    return options, prompt_tokens
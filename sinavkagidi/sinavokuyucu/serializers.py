@@ -0,0 +1,12 @@
+from rest_framework import serializers
+
+from .models import GradedResult
+
+
+class GradedResultSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = GradedResult
+        fields = [
+            "id", "exam", "question", "question_key", "student", "student_answer", "grade",
+            "grade_label", "reason", "source", "processing_time_ms", "prompt_tokens", "created_at",
+        ]
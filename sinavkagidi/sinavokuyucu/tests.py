@@ -1,3 +1,535 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import threading
+import time
+import zipfile
+from unittest import mock
 
-# Create your tests here.
+import cv2
+import numpy as np
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.uploadhandler import StopUpload
+from django.db import DatabaseError
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+
+from . import batch, omr
+from .llm_json import (
+    GRADING_SCHEMA, STRUCTURING_SCHEMA, _coerce, _matches_schema, parse_json_output, parse_metrics, request_json,
+)
+from .model_manager import TEXT_MODEL_NAME, ModelResidencyManager, keep_alive_seconds, model_manager
+from .prompt_budget import PromptBudgetError, context_options
+from .uploads import UploadSizeLimitHandler
+from .models import ExamTemplate, GradedResult
+from .views import (
+    _filter_graded_results, _find_template, _parse_students, _validate_template_regions, get_llm_grading, grade_handwritten_answer,
+    grade_multiple_text_answers, store_graded_results,
+)
+
+
+class ModelResidencyManagerTests(SimpleTestCase):
+    def _run_jobs(self, manager, models):
+        order = []
+        lock = threading.Lock()
+        release = threading.Event()
+
+        def job(model, hold=None):
+            with manager.use(model):
+                with lock:
+                    order.append(model)
+                if hold is not None:
+                    hold.wait(5)
+
+        # İlk iş, diğer işlerin hepsi sıraya girene ya da çalışmaya başlayana kadar aktif modeli tutar.
+        first = threading.Thread(target=job, args=(models[0], release))
+        first.start()
+        while not order:
+            time.sleep(0.001)
+        threads = [threading.Thread(target=job, args=(m,)) for m in models[1:]]
+        for thread in threads:
+            thread.start()
+        # Aktif modelle aynı modeldeki işler beklemeden girer; diğerleri sıraya girmelidir.
+        deadline = time.time() + 5
+        while len(order) - 1 + sum(manager._waiting.values()) < len(threads) and time.time() < deadline:
+            time.sleep(0.001)
+        release.set()
+        for thread in [first] + threads:
+            thread.join()
+        return order
+
+    def test_drains_active_model_before_switching(self):
+        manager = ModelResidencyManager(max_consecutive=100)
+        order = self._run_jobs(manager, ["vision", "text", "vision", "text", "vision"])
+        self.assertEqual(order, ["vision", "vision", "vision", "text", "text"])
+
+    def test_prefers_resident_model_when_switching(self):
+        manager = ModelResidencyManager(max_consecutive=100, models_fit_together=True)
+        manager.resident = {"text"}
+        order = self._run_jobs(manager, ["other", "vision", "text"])
+        self.assertEqual(order, ["other", "text", "vision"])
+
+    def test_switch_evicts_other_models_when_they_do_not_fit(self):
+        manager = ModelResidencyManager()
+        with manager.use("vision"):
+            pass
+        with manager.use("text"):
+            pass
+        self.assertEqual(manager.resident, {"text"})
+
+    def test_does_not_rewarm_after_keep_alive_expired(self):
+        manager = ModelResidencyManager(keep_alive={"text": "10m"})
+        manager._last_used["text"] = 1000.0
+        self.assertTrue(manager._should_rewarm("text", 1000.0 + 60))
+        self.assertFalse(manager._should_rewarm("text", 1000.0 + 601))
+
+    def test_background_loop_does_not_rewarm_when_models_do_not_fit(self):
+        manager = ModelResidencyManager(refresh_interval=0.01)
+        manager._last_used = {m: time.time() for m in manager.keep_alive}
+        with mock.patch.object(manager, "warm_up") as warm_up, \
+                mock.patch.object(manager, "refresh_resident"):
+            manager.start()
+            time.sleep(0.05)
+            manager.stop()
+            manager._thread.join()
+        # Başlangıçta yalnızca ilk model ısıtılır, sonra hiçbir model yeniden yüklenmez.
+        self.assertEqual(warm_up.call_count, 1)
+
+    def test_keep_alive_seconds(self):
+        self.assertEqual(keep_alive_seconds("30m"), 1800)
+        self.assertEqual(keep_alive_seconds("1h"), 3600)
+        self.assertEqual(keep_alive_seconds(-1), -1)
+        self.assertEqual(keep_alive_seconds("45"), 45)
+        self.assertEqual(keep_alive_seconds("1h30m"), 5400)
+        self.assertEqual(keep_alive_seconds(" 90s "), 90)
+        self.assertEqual(keep_alive_seconds("-1m"), -60)
+        for value in ("30 dakika", "m", "1h30"):
+            with self.subTest(value=value), self.assertRaises(ValueError):
+                keep_alive_seconds(value)
+
+    def test_invalid_keep_alive_does_not_rewarm(self):
+        manager = ModelResidencyManager(keep_alive={"text": "yarım saat"})
+        manager._last_used["text"] = time.time()
+        self.assertFalse(manager._should_rewarm("text", time.time()))
+
+
+class BubbleGradingTests(SimpleTestCase):
+    OPTIONS = {"A": [20, 20, 30, 30], "B": [70, 20, 30, 30], "C": [120, 20, 30, 30]}
+
+    def setUp(self):
+        # Boş şablon: basılı şık çemberleri ve biraz yazı.
+        self.blank = np.full((80, 200), 245, dtype=np.uint8)
+        for x, y, w, h in self.OPTIONS.values():
+            cv2.circle(self.blank, (x + w // 2, y + h // 2), 12, 40, 2)
+        cv2.putText(self.blank, "SORU 1", (5, 75), cv2.FONT_HERSHEY_SIMPLEX, 0.4, 30, 1)
+
+    def _page(self, fills, noise=8, seed=0):
+        page = self.blank.copy()
+        for option, radius in fills.items():
+            x, y, w, h = self.OPTIONS[option]
+            cv2.circle(page, (x + w // 2, y + h // 2), radius, 50, -1)
+        rng = np.random.default_rng(seed)
+        noisy = page.astype(np.int16) + rng.normal(0, noise, page.shape).astype(np.int16)
+        return np.clip(noisy, 0, 255).astype(np.uint8)
+
+    def _grade(self, page):
+        bubble = {"id": "1", "correct": "B", "points": 5, "options": self.OPTIONS}
+        return omr.grade_bubbles(page, bubble, blank_image=self.blank, blank_cutoff=omr.dark_cutoff(self.blank))
+
+    def test_empty_bubbles_are_not_marked(self):
+        result = self._grade(self._page({}))
+        self.assertEqual(result["marked"], [])
+        for fill in result["fill_ratios"].values():
+            self.assertLess(fill, 0.05)
+
+    def test_filled_bubble_is_marked(self):
+        for seed in range(5):
+            result = self._grade(self._page({"B": 12}, seed=seed))
+            self.assertEqual(result["marked"], ["B"])
+            self.assertEqual(result["grading"]["grade"], 5)
+
+    def test_partial_mark_is_not_marked(self):
+        result = self._grade(self._page({"A": 5, "B": 12}))
+        self.assertLess(result["fill_ratios"]["A"], omr.BUBBLE_FILL_THRESHOLD)
+        self.assertEqual(result["marked"], ["B"])
+
+    def test_multiple_marks_get_zero(self):
+        result = self._grade(self._page({"A": 12, "B": 12}))
+        self.assertEqual(result["marked"], ["A", "B"])
+        self.assertEqual(result["grading"]["grade"], 0)
+
+
+class TemplateRegionValidationTests(SimpleTestCase):
+    def test_valid_regions(self):
+        regions = {
+            "answer_boxes": [{"id": "1", "question": "q", "reference_text": "r", "box": [0, 0, 10, 10]}],
+            "bubbles": [{"id": "2", "correct": "A", "options": {"A": [0, 0, 5, 5], "B": [5, 0, 5, 5]}}],
+        }
+        self.assertIsNone(_validate_template_regions(regions))
+
+    def test_malformed_regions_return_message(self):
+        for regions in (
+            [],
+            {"answer_boxes": "x"},
+            {"answer_boxes": ["x"]},
+            {"answer_boxes": [{"question": "q", "reference_text": "r", "box": 5}]},
+            {"answer_boxes": [{"question": "q", "reference_text": "r", "box": ["a", 0, 1, 1]}]},
+            {"bubbles": [5]},
+            {"bubbles": [{"correct": "A", "options": {"A": 5}}]},
+            {"bubbles": [{"correct": "A", "options": ["A"]}]},
+        ):
+            with self.subTest(regions=regions):
+                self.assertIsInstance(_validate_template_regions(regions), str)
+
+
+class TemplateLookupTests(TestCase):
+    def test_numeric_name_and_id_are_both_reachable(self):
+        first = ExamTemplate.objects.create(name="ilk")
+        numeric = ExamTemplate.objects.create(name=str(first.pk))
+        self.assertEqual(_find_template({"template_name": str(first.pk)}), numeric)
+        self.assertEqual(_find_template({"template_id": str(first.pk)}), first)
+        # Eski 'template' alanında ad önceliklidir, ad yoksa pk'ye bakılır.
+        self.assertEqual(_find_template({"template": str(first.pk)}), numeric)
+        self.assertEqual(_find_template({"template": str(numeric.pk)}), numeric)
+        self.assertEqual(_find_template({"template": "ilk"}), first)
+        self.assertIsNone(_find_template({"template_id": "ilk"}))
+
+
+class GradedResultStorageTests(TestCase):
+    def test_from_grading_splits_numeric_and_label_grades(self):
+        numeric = GradedResult.from_grading({"grade": "7.5", "reason": "iyi"}, "Soru?", exam="vize")
+        self.assertEqual(numeric.grade, 7.5)
+        self.assertEqual(numeric.grade_label, "7.5")
+        self.assertEqual(numeric.reason, "iyi")
+        label = GradedResult.from_grading({"grade": "JSON Hatası"}, "Soru?", source=GradedResult.SOURCE_CSV)
+        self.assertIsNone(label.grade)
+        self.assertEqual(label.grade_label, "JSON Hatası")
+        self.assertEqual(label.source, GradedResult.SOURCE_CSV)
+        self.assertEqual(numeric.question_key, label.question_key)
+
+    def test_long_question_is_stored_in_full(self):
+        question = "Uzun soru " * 100
+        store_graded_results([GradedResult.from_grading({"grade": 5}, question)])
+        stored = GradedResult.objects.get()
+        self.assertEqual(stored.question, question)
+        self.assertEqual(stored.question_key, GradedResult.make_question_key(question))
+        self.assertEqual(list(_filter_graded_results({"question": question})), [stored])
+        # Aynı 500 karakterle başlayan farklı bir soru ayrı tutulur.
+        self.assertFalse(_filter_graded_results({"question": question[:500]}).exists())
+
+    def test_store_graded_results_bulk_creates_and_swallows_db_errors(self):
+        store_graded_results([])
+        store_graded_results([GradedResult.from_grading({"grade": g}, "Soru?") for g in (1, 2, 3)])
+        self.assertEqual(GradedResult.objects.count(), 3)
+        with mock.patch.object(GradedResult.objects, "bulk_create", side_effect=DatabaseError("kilitli")):
+            store_graded_results([GradedResult.from_grading({"grade": 4}, "Soru?")])
+        self.assertEqual(GradedResult.objects.count(), 3)
+
+
+class GradedResultAPITests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        rows = [
+            ("vize", "S1", "ali", 10, GradedResult.SOURCE_TEXT),
+            ("vize", "S1", "ayse", 6, GradedResult.SOURCE_TEXT),
+            ("vize", "S1", "can", 6, GradedResult.SOURCE_IMAGE),
+            ("vize", "S1", "deniz", "JSON Hatası", GradedResult.SOURCE_TEXT),
+            ("vize", "S2", "ali", 4, GradedResult.SOURCE_CSV),
+            ("final", "S1", "ali", 8, GradedResult.SOURCE_TEMPLATE),
+        ]
+        store_graded_results([
+            GradedResult.from_grading({"grade": grade, "reason": "r"}, question, exam=exam, student=student,
+                                      source=source)
+            for exam, question, student, grade, source in rows
+        ])
+
+    def test_list_filters(self):
+        cases = {
+            "exam=vize": 5,
+            "exam=vize&question=S1": 4,
+            "student=ali": 3,
+            "source=csv": 1,
+            "grade_min=6": 4,
+            "grade_min=5&grade_max=8": 3,
+            "question=S3": 0,
+        }
+        for query, expected in cases.items():
+            with self.subTest(query=query):
+                response = self.client.get(f"/api/sinav/results/?{query}")
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.json()["count"], expected)
+
+    def test_list_ordering(self):
+        response = self.client.get("/api/sinav/results/?ordering=-grade&exam=vize&question=S1")
+        grades = [row["grade"] for row in response.json()["results"]]
+        # SQLite'ta NULL en küçük değer sayılır; azalan sıralamada sona düşer.
+        self.assertEqual(grades, [10, 6, 6, None])
+
+    def test_invalid_parameters_return_400(self):
+        for query in ("grade_min=yuksek", "grade_max=1,5", "ordering=reason", "ordering=-student_answer"):
+            with self.subTest(query=query):
+                self.assertEqual(self.client.get(f"/api/sinav/results/?{query}").status_code, 400)
+        self.assertEqual(self.client.get("/api/sinav/results/stats/?grade_min=x").status_code, 400)
+        self.assertEqual(self.client.get("/api/sinav/results/export/?ordering=reason").status_code, 400)
+        self.assertEqual(self.client.get("/api/sinav/results/export/?export_format=xml").status_code, 400)
+
+    def test_pagination(self):
+        first = self.client.get("/api/sinav/results/?page_size=4&ordering=student").json()
+        self.assertEqual(first["count"], 6)
+        self.assertEqual(len(first["results"]), 4)
+        self.assertIsNone(first["previous"])
+        self.assertIn("page=2", first["next"])
+        second = self.client.get(first["next"]).json()
+        self.assertEqual(len(second["results"]), 2)
+        self.assertIsNone(second["next"])
+        ids = [row["id"] for row in first["results"] + second["results"]]
+        self.assertEqual(sorted(ids), sorted(GradedResult.objects.values_list("id", flat=True)))
+        self.assertEqual(self.client.get("/api/sinav/results/?page=9").status_code, 404)
+
+    def test_stats_aggregates_and_distribution(self):
+        data = self.client.get("/api/sinav/results/stats/?exam=vize").json()
+        self.assertEqual(data["overall"], {"count": 5, "average": 6.5, "minimum": 4.0, "maximum": 10.0})
+        by_question = {row["question"]: row for row in data["questions"]}
+        self.assertEqual(set(by_question), {"S1", "S2"})
+        s1 = by_question["S1"]
+        self.assertEqual(s1["question_key"], GradedResult.make_question_key("S1"))
+        self.assertEqual((s1["count"], s1["graded_count"], s1["ungraded_count"]), (4, 3, 1))
+        self.assertEqual((s1["average"], s1["minimum"], s1["maximum"]), (7.33, 6.0, 10.0))
+        self.assertEqual(s1["distribution"], [{"grade": 6.0, "count": 2}, {"grade": 10.0, "count": 1}])
+        self.assertEqual(by_question["S2"]["distribution"], [{"grade": 4.0, "count": 1}])
+
+        empty = self.client.get("/api/sinav/results/stats/?exam=yok").json()
+        self.assertEqual(empty["overall"]["count"], 0)
+        self.assertIsNone(empty["overall"]["average"])
+        self.assertEqual(empty["questions"], [])
+
+    def test_csv_export(self):
+        response = self.client.get("/api/sinav/results/export/?exam=vize&question=S2")
+        self.assertEqual(response["Content-Type"], "text/csv")
+        self.assertIn('filename="graded_results.csv"', response["Content-Disposition"])
+        body = b"".join(response.streaming_content).decode("utf-8")
+        self.assertTrue(body.startswith("\ufeff"))
+        rows = list(csv.reader(io.StringIO(body[1:]), delimiter=";"))
+        self.assertEqual(rows[0][:4], ["id", "exam", "question", "question_key"])
+        self.assertEqual(len(rows), 2)
+        row = dict(zip(rows[0], rows[1]))
+        self.assertEqual((row["student"], row["grade"], row["source"]), ("ali", "4.0", "csv"))
+
+    def test_json_export(self):
+        response = self.client.get("/api/sinav/results/export/?export_format=json&student=ali&ordering=grade")
+        self.assertEqual(response["Content-Type"], "application/json")
+        rows = json.loads(b"".join(response.streaming_content))
+        self.assertEqual([row["grade"] for row in rows], [4.0, 8.0, 10.0])
+        stored = GradedResult.objects.get(pk=rows[0]["id"])
+        self.assertEqual(rows[0]["created_at"], stored.created_at.isoformat())
+        self.assertEqual(json.loads(self.client.get(
+            "/api/sinav/results/export/?export_format=json&exam=yok").getvalue()), [])
+
+
+class BatchPipelineTests(SimpleTestCase):
+    def test_corrupt_pdf_raises_input_error(self):
+        upload = SimpleUploadedFile("sinav.pdf", b"%PDF-1.4 bozuk")
+        with self.assertRaises(batch.BatchInputError):
+            list(batch.iter_batch_pages(upload))
+
+    def test_oversized_zip_entry_is_skipped(self):
+        image = omr.encode_jpeg(np.full((20, 20), 200, dtype=np.uint8))
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w") as archive:
+            archive.writestr("ali/1.jpg", image)
+            archive.writestr("ali/2.jpg", image + b"\0" * 1024)
+        buffer.seek(0)
+        names = [name for name, _ in batch.iter_zip_images(buffer, max_entry_size=len(image) + 10)]
+        self.assertEqual(names, ["ali/1.jpg"])
+
+    def test_results_follow_input_order(self):
+        pages = (batch.PageItem(i, str(i), "ogrenci", 1) for i in range(6))
+        stages = [("a", lambda item: item.data.setdefault("seen", []).append("a")),
+                  ("b", lambda item: item.data["seen"].append("b"))]
+        items = list(batch.run_pipeline(pages, stages))
+        self.assertEqual([item.index for item in items], list(range(6)))
+        self.assertTrue(all(item.data["seen"] == ["a", "b"] for item in items))
+
+    def test_ocr_drains_before_grading_model_loads(self):
+        manager = ModelResidencyManager()
+        order = []
+
+        def call(model):
+            with manager.use(model):
+                order.append(model[0].upper())
+                time.sleep(0.005)
+
+        stages = [("preprocess", lambda item: None),
+                  ("ocr", lambda item: call("vision"), batch.UNBOUNDED),
+                  ("grade", lambda item: call("text"), batch.UNBOUNDED)]
+        pages = (batch.PageItem(i, str(i), "ogrenci", 1) for i in range(12))
+        list(batch.run_pipeline(pages, stages))
+        self.assertEqual("".join(order), "V" * 12 + "T" * 12)
+
+    def test_parse_students(self):
+        self.assertEqual(_parse_students('["ali", "ayşe"]'), ["ali", "ayşe"])
+        self.assertEqual(_parse_students("ali, ayşe"), ["ali", "ayşe"])
+        self.assertEqual(_parse_students("123"), ["123"])
+        self.assertEqual(_parse_students('"ali"'), ["ali"])
+        self.assertEqual(_parse_students(""), [])
+        for raw in ('{"a": 1}', "[1, 2]", "true", "null"):
+            with self.subTest(raw=raw):
+                self.assertIsNone(_parse_students(raw))
+
+    def test_early_close_stops_threads(self):
+        before = threading.active_count()
+        pages = (batch.PageItem(i, str(i), "ogrenci", 1) for i in range(100))
+        pipeline = batch.run_pipeline(pages, [("a", lambda item: None), ("b", lambda item: None)], queue_size=1)
+        next(pipeline)
+        pipeline.close()
+        deadline = time.time() + 5
+        while threading.active_count() > before and time.time() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(threading.active_count(), before)
+
+
+class ParseJSONOutputTests(SimpleTestCase):
+    def test_plain_json(self):
+        self.assertEqual(parse_json_output('{"grade": 5, "reason": "x"}'), ({"grade": 5, "reason": "x"}, False))
+
+    def test_fenced_json(self):
+        value, repaired = parse_json_output('```json\n{"grade": 5, "reason": "x"}\n```')
+        self.assertEqual(value, {"grade": 5, "reason": "x"})
+        self.assertTrue(repaired)
+
+    def test_trailing_fence_without_opening(self):
+        value, _ = parse_json_output('{"grade":5,"reason":"x"}\n```')
+        self.assertEqual(value, {"grade": 5, "reason": "x"})
+
+    def test_backticks_inside_string(self):
+        for text in ('{"grade": 3, "reason": "kod ``` ile yazılmış"}',
+                     '```json\n{"grade": 3, "reason": "kod ``` ile yazılmış"}\n```'):
+            with self.subTest(text=text):
+                value, _ = parse_json_output(text)
+                self.assertEqual(value["reason"], "kod ``` ile yazılmış")
+
+    def test_surrounding_prose(self):
+        value, _ = parse_json_output('Notlandırma: {"grade": 7, "reason": "iyi"} Başarılar!')
+        self.assertEqual(value, {"grade": 7, "reason": "iyi"})
+
+    def test_repairs_truncated_output(self):
+        cases = {
+            '{"grade": 4, "reason": "eksik': {"grade": 4, "reason": "eksik"},
+            '{"grade": 4, "rea': {"grade": 4},
+            '{"grade": 4,': {"grade": 4},
+            '```json\n{"items": [{"question": "1", "answer": "a"}, {"question"': {"items": [{"question": "1", "answer": "a"}, {}]},
+            '```json\n{"grade": 4, "reason": "yarım\n```': {"grade": 4, "reason": "yarım"},
+        }
+        for text, expected in cases.items():
+            with self.subTest(text=text):
+                self.assertEqual(parse_json_output(text), (expected, True))
+
+    def test_no_json_raises(self):
+        with self.assertRaises(ValueError):
+            parse_json_output("Cevap veremiyorum.")
+
+    def test_schema_check_and_coerce(self):
+        self.assertFalse(_matches_schema({"grade": 4}, GRADING_SCHEMA))
+        self.assertTrue(_matches_schema({"grade": 4.5, "reason": "x"}, GRADING_SCHEMA))
+        for value in ({"grade": "iyi", "reason": 3}, {"grade": True, "reason": "x"}, {"grade": 4, "reason": None}):
+            with self.subTest(value=value):
+                self.assertFalse(_matches_schema(value, GRADING_SCHEMA))
+        self.assertFalse(_matches_schema({"items": [{"question": "1", "answer": 2}]}, STRUCTURING_SCHEMA))
+        items = [{"question": "1", "answer": "a"}]
+        self.assertEqual(_coerce(items, "items"), {"items": items})
+        self.assertEqual(_coerce(items), items)
+        self.assertTrue(_matches_schema(_coerce(items, "items"), STRUCTURING_SCHEMA))
+
+
+class ContextOptionsTests(SimpleTestCase):
+    def test_num_ctx_is_constant_per_model(self):
+        short, _ = context_options(TEXT_MODEL_NAME, "kısa", 100)
+        long, long_tokens = context_options(TEXT_MODEL_NAME, "uzun metin " * 1500, 400)
+        self.assertEqual(short["num_ctx"], long["num_ctx"])
+        self.assertEqual((short["num_predict"], long["num_predict"]), (100, 400))
+        self.assertGreater(long_tokens, 4000)
+
+    def test_overflow_raises_instead_of_silent_truncation(self):
+        with self.assertRaises(PromptBudgetError):
+            context_options(TEXT_MODEL_NAME, "uzun metin " * 6000, 400)
+
+    def test_long_student_answer_is_trimmed_to_fit(self):
+        answer = "Nuri Efendi sabah erkenden işe gidiyor. " * 2000
+        with mock.patch("sinavokuyucu.views.request_json", return_value={"grade": 5, "reason": "x"}) as request:
+            get_llm_grading("Soru?", "Referans metin.", answer)
+        payload = request.call_args.args[0]
+        prompt = payload["messages"][0]["content"]
+        self.assertIn("Referans metin.", prompt)
+        self.assertIn("[...]", prompt)
+        self.assertLessEqual(context_options(TEXT_MODEL_NAME, prompt, 400)[1] + 400, payload["options"]["num_ctx"])
+
+    def test_warm_up_sends_same_num_ctx(self):
+        manager = ModelResidencyManager(num_ctx={TEXT_MODEL_NAME: 3072})
+        with mock.patch("sinavokuyucu.model_manager.requests.post") as post:
+            manager.warm_up(TEXT_MODEL_NAME)
+        self.assertEqual(post.call_args.kwargs["json"]["options"], {"num_ctx": 3072})
+        self.assertEqual(
+            model_manager.options_for(TEXT_MODEL_NAME)["num_ctx"],
+            context_options(TEXT_MODEL_NAME, "x", 10)[0]["num_ctx"],
+        )
+
+
+class RequestJSONTests(SimpleTestCase):
+    def _response(self, content, prompt_eval_count):
+        response = mock.Mock()
+        response.json.return_value = {
+            "message": {"content": content}, "prompt_eval_count": prompt_eval_count, "eval_count": 20,
+        }
+        return response
+
+    def test_retry_reports_last_attempt_tokens(self):
+        responses = [self._response("bozuk", 300), self._response('{"grade": 5, "reason": "x"}', 340)]
+        stats = {}
+        with mock.patch("sinavokuyucu.llm_json.ollama_chat", side_effect=responses):
+            value = request_json({"model": TEXT_MODEL_NAME, "messages": []}, GRADING_SCHEMA, "test", 1, stats=stats)
+        self.assertEqual(value, {"grade": 5, "reason": "x"})
+        self.assertEqual(stats, {"prompt_eval_count": 340, "eval_count": 20, "attempts": 2})
+
+    def test_wrong_leaf_types_are_retried(self):
+        responses = [self._response('{"grade": "iyi", "reason": 3}', 300),
+                     self._response('{"grade": 7, "reason": "iyi"}', 340)]
+        parse_metrics.reset()
+        with mock.patch("sinavokuyucu.llm_json.ollama_chat", side_effect=responses) as chat:
+            value = request_json({"model": TEXT_MODEL_NAME, "messages": []}, GRADING_SCHEMA, "test", 1)
+        self.assertEqual(value, {"grade": 7, "reason": "iyi"})
+        self.assertEqual(chat.call_count, 2)
+        self.assertEqual(parse_metrics.snapshot()["test"]["retried"], 1)
+        parse_metrics.reset()
+
+
+class UploadLimitTests(SimpleTestCase):
+    def test_oversized_csv_returns_413(self):
+        request = RequestFactory().post("/api/sinav/grade-multiple-text/", data={
+            "csv_file": SimpleUploadedFile("cevaplar.csv", b"ogrenci;cevap\n" + b"a;b\n" * 100),
+            "question": "q",
+            "reference_text": "r",
+        })
+        with mock.patch("sinavokuyucu.views.UPLOAD_MAX_CSV_SIZE", 64):
+            response = grade_multiple_text_answers(request)
+        self.assertEqual(response.status_code, 413)
+
+    @override_settings(UPLOAD_MAX_SIZE=1024 * 1024)
+    def test_request_limit_is_reported_instead_of_image_limit(self):
+        request = RequestFactory().post("/api/sinav/grade/", data={
+            "image": SimpleUploadedFile("cevap.jpeg", b"x" * (2 * 1024 * 1024)),
+            "question": "q",
+            "reference_text": "r",
+        })
+        response = grade_handwritten_answer(request)
+        self.assertEqual(response.status_code, 413)
+        self.assertIn("İstek çok büyük", response.data["detail"])
+        self.assertIn("en fazla 1 MB", response.data["detail"])
+
+    @override_settings(UPLOAD_MAX_SIZE=100, UPLOAD_DRAIN_MAX_SIZE=1000)
+    def test_moderately_oversized_request_is_drained(self):
+        for content_length, connection_reset in ((500, False), (5000, True), (None, True)):
+            with self.subTest(content_length=content_length):
+                handler = UploadSizeLimitHandler(RequestFactory().post("/"))
+                handler.handle_raw_input(None, {}, content_length, b"sinir")
+                with self.assertRaises(StopUpload) as raised:
+                    handler.receive_data_chunk(b"x" * 200, 0)
+                self.assertEqual(raised.exception.connection_reset, connection_reset)
@@ -0,0 +1,131 @@
+import base64
+import json
+import uuid
+
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+
+# --- Ayarlar ---
+# Base64 her 3 baytı 4 karaktere çevirir; okuma boyutu 3'ün katı olmalı ki parçalar
+# birleştirildiğinde araya dolgu ('=') girmesin.
+BASE64_READ_SIZE = 3 * 64 * 1024
+
+
+def upload_limit(name, default):
+    return getattr(settings, name, default)
+
+
+class UploadSizeLimitHandler(FileUploadHandler):
+    """
+    Yüklemeyi, istekteki dosyaların toplamı UPLOAD_MAX_SIZE'ı aştığı anda keser.
+    Content-Length başlığı zaten sınırı aşıyorsa ilk dosya parçasında durdurulur.
+    Sınır aşıldığında request üzerinde `upload_too_large` ve aşılan sınır
+    (`upload_limit_exceeded`) işaretlenir; view'lar bunu 413 olarak döndürür.
+
+    Kesilen yüklemede gövdenin kalanı ya okunup atılır ya da bağlantı kapatılır. Bağlantı
+    kapatılırsa çoğu sunucu/istemci 413 yanıtını okuyamadan "connection reset" görür. Bu
+    yüzden Content-Length'i UPLOAD_DRAIN_MAX_SIZE'ı aşmayan istekler sonuna kadar okunur
+    (istemci 413'ü alır); daha büyük ya da uzunluğu bilinmeyen isteklerde bağlantı kesilir.
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.limit = upload_limit('UPLOAD_MAX_SIZE', 200 * 1024 * 1024)
+        self.drain_limit = upload_limit('UPLOAD_DRAIN_MAX_SIZE', 250 * 1024 * 1024)
+        self.received = 0
+        self.over_limit = False
+        self.drain = False
+
+    def _abort(self):
+        self.request.upload_too_large = True
+        self.request.upload_limit_exceeded = self.limit
+        raise StopUpload(connection_reset=not self.drain)
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        # StopUpload burada yakalanmaz; sadece işaretlenir, ilk dosya parçasında kesilir.
+        self.over_limit = bool(content_length and content_length > self.limit)
+        self.drain = bool(content_length) and content_length <= self.drain_limit
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.over_limit or self.received > self.limit:
+            self._abort()
+        return raw_data
+
+    def file_complete(self, file_size):
+        return None
+
+
+def exceeded_upload_limit(request, uploaded_file=None, limit=None):
+    """
+    Aşılan yükleme sınırını döndürür: istek geneli için ("request", UPLOAD_MAX_SIZE),
+    dosyaya özgü sınır için ("file", limit). Sınır aşılmadıysa None döndürür.
+    """
+    if getattr(request, 'upload_too_large', False):
+        return "request", getattr(request, 'upload_limit_exceeded', upload_limit('UPLOAD_MAX_SIZE', 200 * 1024 * 1024))
+    if uploaded_file is not None and limit is not None and uploaded_file.size > limit:
+        return "file", limit
+    return None
+
+
+def upload_too_large(request, uploaded_file=None, limit=None):
+    """Yükleme genel sınırı ya da (verilirse) dosyaya özgü sınırı aşıyor mu?"""
+    return exceeded_upload_limit(request, uploaded_file, limit) is not None
+
+
+class StreamedImage:
+    """
+    Yüklenen bir dosyayı, Ollama isteğinin gövdesine base64 olarak parça parça yazılmak
+    üzere sarar. Dosyanın tamamı ya da base64 hali hiçbir zaman bellekte birleştirilmez.
+    """
+
+    def __init__(self, file_obj):
+        self.file = file_obj
+
+    def iter_base64(self, read_size=BASE64_READ_SIZE):
+        self.file.seek(0)
+        while True:
+            chunk = self.file.read(read_size)
+            if not chunk:
+                break
+            yield base64.b64encode(chunk)
+
+
+def _has_streamed_images(payload):
+    return any(
+        isinstance(image, StreamedImage)
+        for message in payload.get('messages', [])
+        for image in message.get('images', [])
+    )
+
+
+def iter_json_body(payload):
+    """
+    İstek gövdesini JSON olarak üretir; StreamedImage nesnelerinin yerine base64 verisini
+    dosyadan okudukça yazar. requests'e `data=` olarak verilir (chunked transfer).
+    """
+    placeholders = {}
+
+    def default(obj):
+        if isinstance(obj, StreamedImage):
+            key = f"__streamed_image_{uuid.uuid4().hex}__"
+            placeholders[key] = obj
+            return key
+        raise TypeError(f"{type(obj).__name__} JSON'a çevrilemez")
+
+    body = json.dumps(payload, default=default)
+    position = 0
+    while placeholders:
+        # Yer tutucular gövdede tırnak içinde geçer; tırnaklar korunur, sadece içerik değişir.
+        key, index = min(((k, body.index(k, position)) for k in placeholders), key=lambda x: x[1])
+        yield body[position:index].encode('utf-8')
+        yield from placeholders.pop(key).iter_base64()
+        position = index + len(key)
+    yield body[position:].encode('utf-8')
+
+
+def request_body_kwargs(payload):
+    """requests.post için gövde argümanlarını döndürür: gerekirse akışlı, değilse `json=`."""
+    if _has_streamed_images(payload):
+        return {"data": iter_json_body(payload), "headers": {"Content-Type": "application/json"}}
+    return {"json": payload}
@@ -1,9 +1,20 @@
 from django.urls import path
-from .views import grade_handwritten_answer, grade_full_page_answers, grade_text_answer, grade_multiple_text_answers
+from .views import (
+    grade_handwritten_answer, grade_full_page_answers, grade_text_answer, grade_multiple_text_answers,
+    register_exam_template, grade_template_page, grade_batch_pages, llm_metrics,
+    list_graded_results, graded_result_stats, export_graded_results,
+)
 
 urlpatterns = [
     path('grade/', grade_handwritten_answer, name='grade-answer'),
     path('grade-full-page/', grade_full_page_answers, name='grade-full-page'),
     path('grade-text/', grade_text_answer, name='grade-text'),
     path('grade-multiple-text/', grade_multiple_text_answers, name='grade-multiple-text'),
+    path('templates/', register_exam_template, name='register-exam-template'),
+    path('grade-template-page/', grade_template_page, name='grade-template-page'),
+    path('grade-batch/', grade_batch_pages, name='grade-batch'),
+    path('metrics/', llm_metrics, name='llm-metrics'),
+    path('results/', list_graded_results, name='graded-results'),
+    path('results/stats/', graded_result_stats, name='graded-result-stats'),
+    path('results/export/', export_graded_results, name='graded-result-export'),
 ]
\ No newline at end of file
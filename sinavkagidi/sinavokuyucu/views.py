@@ -4,19 +4,50 @@ import requests
 import base64
 import csv
 import io
-import re  # Regex kütüphanesi eklendi
 import traceback
+import cv2
 from rest_framework.decorators import api_view, permission_classes, parser_classes
 from rest_framework.permissions import AllowAny
 from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
 from rest_framework import status
-from django.http import FileResponse
+from django.db import DatabaseError
+from django.db.models import Avg, Count, Max, Min, Q
+from django.http import FileResponse, StreamingHttpResponse
+
+from . import batch, omr
+from .llm_json import GRADING_SCHEMA, STRUCTURING_SCHEMA, LLMJSONError, parse_metrics, request_json
+from .prompt_budget import (
+    CRITERIA_MAX_TOKENS, GRADING_NUM_PREDICT, MIN_ANSWER_TOKENS, OCR_NUM_PREDICT, QUESTION_MAX_TOKENS,
+    REFERENCE_MAX_TOKENS, STRUCTURING_MIN_PREDICT, PromptBudgetError, context_options, estimate_tokens, fit_block,
+    remaining_tokens, trim_block,
+)
+from .model_manager import VISION_MODEL_NAME, TEXT_MODEL_NAME, ollama_chat
+from .models import ExamTemplate, GradedResult
+from .serializers import GradedResultSerializer
+from .uploads import StreamedImage, exceeded_upload_limit, upload_limit
+
+UPLOAD_MAX_IMAGE_SIZE = upload_limit('UPLOAD_MAX_IMAGE_SIZE', 20 * 1024 * 1024)
+UPLOAD_MAX_CSV_SIZE = upload_limit('UPLOAD_MAX_CSV_SIZE', 10 * 1024 * 1024)
+UPLOAD_MAX_BATCH_SIZE = upload_limit('UPLOAD_MAX_SIZE', 200 * 1024 * 1024)
+
+
+def _upload_too_large_response(request, uploaded_file, limit, label):
+    """
+    Yükleme sınırı aşıldıysa, aşılan sınırı (istek geneli ya da dosyaya özgü) bildiren 413
+    yanıtını döndürür; aşılmadıysa None döndürür.
+    """
+    exceeded = exceeded_upload_limit(request, uploaded_file, limit)
+    if exceeded is None:
+        return None
+    scope, exceeded_limit = exceeded
+    if scope == "request":
+        detail = f"İstek çok büyük (yüklenen dosyaların toplamı en fazla {exceeded_limit // (1024 * 1024)} MB)."
+    else:
+        detail = f"{label} çok büyük (en fazla {exceeded_limit // (1024 * 1024)} MB)."
+    return Response({"detail": detail}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
 
-# --- Ayarlar ---
-OLLAMA_API_URL = "http://localhost:11434/api/chat"
-VISION_MODEL_NAME = "llama3.2-vision:11b"
-TEXT_MODEL_NAME = "llama3.1:8b"
 
 # --- Çekirdek Fonksiyon: LLM ile Notlandırma ---
 
@@ -34,6 +65,12 @@ def get_llm_grading(question_text, reference_text, student_answer_text, grading_
     print(f"ADIM: Notlandırma için {TEXT_MODEL_NAME} modeli çağrılıyor...")
     start_time_grading = time.time()
 
+    # Uzun soru, referans metin ve kriterler token bütçesine göre kısaltılır (soru başına önbellekli).
+    question_text = fit_block(question_text, QUESTION_MAX_TOKENS)
+    reference_text = fit_block(reference_text, REFERENCE_MAX_TOKENS)
+    if grading_criteria:
+        grading_criteria = fit_block(grading_criteria, CRITERIA_MAX_TOKENS)
+
     prompt_criteria_part = ""
     if grading_criteria:
         prompt_criteria_part = f"""
@@ -66,42 +103,43 @@ def get_llm_grading(question_text, reference_text, student_answer_text, grading_
     
     Öğrenci Cevabı:
     ---
-    {student_answer_text}
+    {{student_answer_text}}
     ---
     
     Notlandırma (Sadece JSON formatında, başka hiçbir metin olmadan):
     """
-    
+
+    # Öğrenci cevabı, prompt'un geri kalanından sonra sabit num_ctx'te kalan bütçeye sığdırılır;
+    # taşan prompt'u Ollama baştan (talimatlar ve referans) sessizce keserdi.
+    answer_budget = remaining_tokens(TEXT_MODEL_NAME, grading_prompt, GRADING_NUM_PREDICT)
+    if answer_budget is not None:
+        if answer_budget < MIN_ANSWER_TOKENS:
+            raise PromptBudgetError(
+                f"Soru, referans ve kriterler {TEXT_MODEL_NAME} bağlam penceresinde öğrenci cevabına yer bırakmıyor "
+                f"({answer_budget} token kaldı)."
+            )
+        # trim_block sınırı birkaç token aşabilir (birleştirme boşlukları); küçük bir pay bırakılır.
+        student_answer_text = trim_block(student_answer_text, answer_budget - 10)
+    # Yer tutucu prompt'taki son alandır; soru metninde geçse bile sadece sondaki değiştirilir.
+    prompt_head, prompt_tail = grading_prompt.rsplit("{student_answer_text}", 1)
+    grading_prompt = prompt_head + student_answer_text + prompt_tail
+
+    options, prompt_tokens = context_options(TEXT_MODEL_NAME, grading_prompt, GRADING_NUM_PREDICT)
     grading_data = {
         "model": TEXT_MODEL_NAME,
         "messages": [{"role": "user", "content": grading_prompt}],
         "stream": False,
-        "format": "json" 
+        "options": options,
     }
+    token_stats = {}
     
     try:
-        grading_response = requests.post(OLLAMA_API_URL, json=grading_data, timeout=45) # Timeout artırıldı
-        grading_response.raise_for_status()
-        llm_output = grading_response.json()
-        
-        grading_result_str = llm_output.get('message', {}).get('content', '{}')
-        
-        print(f"ADIM BAŞARILI: {TEXT_MODEL_NAME} modelinden dönen ham yanıt: {grading_result_str}")
-        
-        # YENİ: Yanıttaki olası Markdown bloğunu temizleme (Regex ile)
-        match = re.search(r'\{.*\}', grading_result_str, re.DOTALL)
-        if match:
-            cleaned_str = match.group(0)
-            print(f"TEMİZLENMİŞ YANIT: {cleaned_str}")
-            try:
-                grading_result_json = json.loads(cleaned_str)
-            except json.JSONDecodeError:
-                print("UYARI: Temizlenmiş yanıtta JSON formatı bozuk. Ham yanıt saklanıyor.")
-                grading_result_json = {"grade": "JSON Hatası", "reason": f"Geçersiz JSON: {cleaned_str}"}
-        else:
-            print("UYARI: Yanıtta JSON nesnesi bulunamadı.")
-            grading_result_json = {"grade": "JSON Bulunamadı", "reason": f"Geçersiz Yanıt: {grading_result_str}"}
-
+        # Yanıt, Ollama'nın structured output desteğiyle GRADING_SCHEMA'ya zorlanır;
+        # bozuk çıktı önce onarılır, olmazsa bir kez yeniden istenir.
+        grading_result_json = request_json(grading_data, GRADING_SCHEMA, "grading", timeout=45, stats=token_stats) # Timeout artırıldı
+    except LLMJSONError as e:
+        print("UYARI: Yanıt onarım ve yeniden denemeye rağmen JSON olarak çözümlenemedi. Ham yanıt saklanıyor.")
+        grading_result_json = {"grade": "JSON Hatası", "reason": f"Geçersiz JSON: {e.raw_output}"}
     except requests.exceptions.RequestException as e:
         print(f"HATA: Notlandırma modeli bağlantı hatası veya hazır değil. Hata: {e}")
         raise
@@ -115,13 +153,153 @@ def get_llm_grading(question_text, reference_text, student_answer_text, grading_
     grade_log = grading_result_json.get('grade', 'N/A')
     reason_log = grading_result_json.get('reason', 'N/A')
     print(f"VERİLEN NOT: {grade_log} | GEREKÇE: {reason_log}")
-    print(f"{TEXT_MODEL_NAME} işlem süresi: {grading_duration:.2f} ms")
+    print(f"{TEXT_MODEL_NAME} işlem süresi: {grading_duration:.2f} ms "
+          f"(prompt: ~{prompt_tokens} token tahmini, {token_stats.get('prompt_eval_count', 'N/A')} gerçek; "
+          f"num_ctx={options['num_ctx']})")
 
     return {
         "grading": grading_result_json,
-        "processing_time": round(grading_duration, 2)
+        "processing_time": round(grading_duration, 2),
+        "prompt_tokens": token_stats.get('prompt_eval_count') or prompt_tokens,
+    }
+
+
+def _record_prompt_tokens(stats, model, estimated, actual):
+    """
+    Bir çağrının prompt boyutunu loglar ve `stats['prompt_tokens']`'a ekler (Ollama'nın
+    bildirdiği gerçek değer, yoksa tahmin). Birden fazla çağrı aynı stats'ı paylaşabilir.
+    """
+    print(f"BİLGİ: {model} prompt boyutu: ~{estimated} token tahmini, {actual or 'N/A'} gerçek.")
+    if stats is not None:
+        stats['prompt_tokens'] = stats.get('prompt_tokens', 0) + (actual or estimated)
+
+
+def transcribe_handwriting(image, stats=None):
+    """
+    El yazısı resmini (base64 string veya StreamedImage) Llama Vision ile metne çevirir
+    ve metni döndürür. `stats` verilirse prompt token sayısı içine eklenir.
+    """
+    ocr_prompt = "Transcribe the handwritten text in the image. Do not add any extra information or analysis. Just return the raw text."
+    options, prompt_tokens = context_options(VISION_MODEL_NAME, ocr_prompt, OCR_NUM_PREDICT, images=1)
+    ocr_data = {
+        "model": VISION_MODEL_NAME,
+        "messages": [
+            {
+                "role": "user",
+                "content": ocr_prompt,
+                "images": [image]
+            }
+        ],
+        "stream": False,
+        "options": options,
+    }
+    ocr_response = ollama_chat(ocr_data, timeout=20)
+    ocr_response.raise_for_status()
+    ocr_output = json.loads(ocr_response.text)
+    _record_prompt_tokens(stats, VISION_MODEL_NAME, prompt_tokens, ocr_output.get('prompt_eval_count'))
+    return ocr_output['message']['content'].strip()
+
+
+def extract_page_text(image, stats=None):
+    """
+    Tam sayfa resmindeki (base64 string veya StreamedImage) tüm metni, sorular ve cevaplar
+    dahil, Llama Vision ile ham metne çevirir. `stats` verilirse prompt token sayısı içine eklenir.
+    """
+    extraction_prompt = "Transcribe all text from the image, including questions and answers. Do not add any new text, formatting, or analysis. Just the raw text."
+
+    options, prompt_tokens = context_options(VISION_MODEL_NAME, extraction_prompt, OCR_NUM_PREDICT, images=1)
+    extraction_data = {
+        "model": VISION_MODEL_NAME,
+        "messages": [
+            {
+                "role": "user",
+                "content": extraction_prompt,
+                "images": [image]
+            }
+        ],
+        "stream": False,
+        "options": options,
+    }
+    extraction_response = ollama_chat(extraction_data, timeout=20)
+    extraction_response.raise_for_status()
+    extraction_output = json.loads(extraction_response.text)
+    _record_prompt_tokens(stats, VISION_MODEL_NAME, prompt_tokens, extraction_output.get('prompt_eval_count'))
+    return extraction_output['message']['content'].strip()
+
+
+def structure_page_text(raw_text, stats=None):
+    """
+    Ham sayfa metnini Llama-3p1-8b ile soru/cevap çiftlerine ayırır.
+    Yanıt JSON olarak çözümlenemezse hata bilgisini ve ham yanıtı döndürür.
+    `stats` verilirse prompt token sayısı içine eklenir.
+    """
+    structuring_prompt = f"""
+    You are an AI assistant that structures text from an exam paper. Given the raw text from a scanned exam page, your task is to identify and separate the questions and their corresponding answers.
+
+    Provide the output as a JSON object with an "items" array. For each item, use the keys 'question' and 'answer'.
+
+    Example format:
+    {{"items": [
+      {{
+        "question": "Question text here.",
+        "answer": "Answer text here."
+      }},
+      {{
+        "question": "Another question text.",
+        "answer": "Another answer text."
+      }}
+    ]}}
+
+    Raw text from the page:
+    ---
+    {raw_text}
+    ---
+
+    Please provide the JSON object now:
+    """
+
+    # Yanıt ham metnin soru/cevap olarak yeniden yazılmış hali olduğundan ham metinle orantılıdır.
+    num_predict = max(STRUCTURING_MIN_PREDICT, int(estimate_tokens(raw_text) * 1.3))
+    options, prompt_tokens = context_options(TEXT_MODEL_NAME, structuring_prompt, num_predict)
+    structuring_data = {
+        "model": TEXT_MODEL_NAME,
+        "messages": [
+            {
+                "role": "user",
+                "content": structuring_prompt,
+            }
+        ],
+        "stream": False,
+        "options": options,
     }
 
+    token_stats = {}
+    try:
+        structured_content = request_json(
+            structuring_data, STRUCTURING_SCHEMA, "structuring", timeout=20, stats=token_stats, list_key="items"
+        )
+    except LLMJSONError as e:
+        print("UYARI: LLM'den geçersiz JSON formatı döndü. Ham yanıt saklanıyor.")
+        _record_prompt_tokens(stats, TEXT_MODEL_NAME, prompt_tokens, token_stats.get('prompt_eval_count'))
+        return {"error": "Invalid JSON format from LLM", "raw_response": e.raw_output}
+    _record_prompt_tokens(stats, TEXT_MODEL_NAME, prompt_tokens, token_stats.get('prompt_eval_count'))
+    print(f"ADIM 2 BAŞARILI: Llama-3p1-8b modelinden {len(structured_content['items'])} soru/cevap çifti döndü.")
+    return structured_content['items']
+
+
+def store_graded_results(results):
+    """
+    Notlandırma sonuçlarını (kaydedilmemiş GradedResult listesi) tek sorguda kaydeder.
+    Veritabanı hatası notlandırma yanıtını bozmaz; sadece loglanır.
+    """
+    if not results:
+        return
+    try:
+        GradedResult.objects.bulk_create(results)
+        print(f"BİLGİ: {len(results)} notlandırma sonucu kaydedildi.")
+    except DatabaseError as e:
+        print(f"UYARI: Notlandırma sonuçları kaydedilemedi. Hata: {e}")
+
 
 # API 1: Llama Vision + Llama 3 Tek Soruluk Değerlendirme
 @api_view(['POST'])
@@ -136,40 +314,27 @@ def grade_handwritten_answer(request):
     question_text = request.data.get('question')
     reference_text = request.data.get('reference_text')
     grading_criteria = request.data.get('criteria')
+    exam = request.data.get('exam', '')
+    student = request.data.get('student', '')
 
+    too_large = _upload_too_large_response(request, handwritten_image, UPLOAD_MAX_IMAGE_SIZE, "Resim dosyası")
+    if too_large:
+        return too_large
     if not all([handwritten_image, question_text, reference_text]):
         return Response(
             {"detail": "Lütfen 'image', 'question' ve 'reference_text' alanlarını doldurun."},
             status=status.HTTP_400_BAD_REQUEST
         )
     print("API ÇAĞRISI: grade_handwritten_answer")
-    try:
-        image_bytes = handwritten_image.read()
-        image_base64 = base64.b64encode(image_bytes).decode('utf-8')
-    except Exception as e:
-        print(f"HATA: Resim dosyası işlenirken bir hata oluştu: {e}")
-        return Response({"detail": f"Error processing image file: {e}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    # Resim belleğe okunmaz; istek gövdesine dosyadan base64 olarak akıtılır.
+    image = StreamedImage(handwritten_image)
 
     # Step 1: Transcribe handwritten text in the image with Llama Vision
     print("ADIM 1: Llama Vision modeli el yazısını metne çevirmek için çağrılıyor...")
     start_time_vision = time.time()
+    vision_stats = {}
     try:
-        ocr_prompt = "Transcribe the handwritten text in the image. Do not add any extra information or analysis. Just return the raw text."
-        ocr_data = {
-            "model": VISION_MODEL_NAME,
-            "messages": [
-                {
-                    "role": "user",
-                    "content": ocr_prompt,
-                    "images": [image_base64]
-                }
-            ],
-            "stream": False
-        }
-        ocr_response = requests.post(OLLAMA_API_URL, json=ocr_data, timeout=20)
-        ocr_response.raise_for_status()
-        ocr_output = json.loads(ocr_response.text)
-        student_answer_text = ocr_output['message']['content'].strip()
+        student_answer_text = transcribe_handwriting(image, stats=vision_stats)
         print(f"ADIM 1 BAŞARILI: Llama Vision'dan dönen metin: {student_answer_text}")
     except Exception as e:
         print(f"HATA: Llama Vision OCR başarısız oldu. Hata: {e}")
@@ -184,11 +349,19 @@ def grade_handwritten_answer(request):
     # Step 2: Grade with Llama-3p1-8b
     try:
         grading_result = get_llm_grading(question_text, reference_text, student_answer_text, grading_criteria)
+    except PromptBudgetError as e:
+        return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         return Response(
             {"detail": str(e)},
             status=status.HTTP_503_SERVICE_UNAVAILABLE
         )
+
+    store_graded_results([GradedResult.from_grading(
+        grading_result['grading'], question_text, student_answer_text, exam=exam, student=student,
+        source=GradedResult.SOURCE_IMAGE, processing_time_ms=grading_result['processing_time'],
+        prompt_tokens=grading_result['prompt_tokens'],
+    )])
     
     final_response = {
         "transcribed_answer": student_answer_text,
@@ -196,7 +369,11 @@ def grade_handwritten_answer(request):
         "processing_times_ms": {
             "llama_vision": round(vision_duration, 2),
             "llama_grading": grading_result['processing_time'],
-        }
+        },
+        "prompt_tokens": {
+            "llama_vision": vision_stats.get('prompt_tokens'),
+            "llama_grading": grading_result['prompt_tokens'],
+        },
     }
     print(f"SONUÇ: Son yanıt döndürülüyor: {json.dumps(final_response, indent=2)}")
     return Response(final_response, status=status.HTTP_200_OK)
@@ -212,41 +389,23 @@ def grade_full_page_answers(request):
     """
     full_page_image = request.FILES.get('image')
 
+    too_large = _upload_too_large_response(request, full_page_image, UPLOAD_MAX_IMAGE_SIZE, "Resim dosyası")
+    if too_large:
+        return too_large
     if not full_page_image:
         return Response(
             {"detail": "Please provide an 'image' file."},
             status=status.HTTP_400_BAD_REQUEST
         )
     print("API ÇAĞRISI: grade_full_page_answers")
-
-    try:
-        image_bytes = full_page_image.read()
-        image_base64 = base64.b64encode(image_bytes).decode('utf-8')
-    except Exception as e:
-        print(f"HATA: Resim dosyası işlenirken bir hata oluştu: {e}")
-        return Response({"detail": f"Error processing image file: {e}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    image = StreamedImage(full_page_image)
 
     # Step 1: Llama Vision ile sadece ham metni çevir
     print("ADIM 1: Llama Vision modeli tam sayfa metin çevirmek için çağrılıyor...")
     start_time_vision = time.time()
+    vision_stats = {}
     try:
-        extraction_prompt = "Transcribe all text from the image, including questions and answers. Do not add any new text, formatting, or analysis. Just the raw text."
-        
-        extraction_data = {
-            "model": VISION_MODEL_NAME,
-            "messages": [
-                {
-                    "role": "user",
-                    "content": extraction_prompt,
-                    "images": [image_base64]
-                }
-            ],
-            "stream": False
-        }
-        extraction_response = requests.post(OLLAMA_API_URL, json=extraction_data, timeout=20)
-        extraction_response.raise_for_status()
-        extraction_output = json.loads(extraction_response.text)
-        raw_text = extraction_output['message']['content'].strip()
+        raw_text = extract_page_text(image, stats=vision_stats)
         print(f"ADIM 1 BAŞARILI: Llama Vision'dan dönen ham metin: {raw_text}")
     except Exception as e:
         print(f"HATA: Llama Vision ham metin çevirme başarısız oldu. Hata: {e}")
@@ -261,61 +420,18 @@ def grade_full_page_answers(request):
     # Step 2: Llama-3p1-8b ile ham metni yapılandır
     print("ADIM 2: Llama-3p1-8b modeli ham metni yapılandırmak için çağrılıyor...")
     start_time_structuring = time.time()
-    structuring_prompt = f"""
-    You are an AI assistant that structures text from an exam paper. Given the raw text from a scanned exam page, your task is to identify and separate the questions and their corresponding answers.
-    
-    Provide the output in a JSON array format. For each item, use the keys 'question' and 'answer'.
-    
-    Example format:
-    [
-      {{
-        "question": "Question text here.",
-        "answer": "Answer text here."
-      }},
-      {{
-        "question": "Another question text.",
-        "answer": "Another answer text."
-      }}
-    ]
-    
-    Raw text from the page:
-    ---
-    {raw_text}
-    ---
-    
-    Please provide the JSON array now:
-    """
-
-    structuring_data = {
-        "model": TEXT_MODEL_NAME,
-        "messages": [
-            {
-                "role": "user",
-                "content": structuring_prompt,
-            }
-        ],
-        "stream": False
-    }
-
+    structuring_stats = {}
     try:
-        structuring_response = requests.post(OLLAMA_API_URL, json=structuring_data, timeout=20)
-        structuring_response.raise_for_status()
-        llm_output = json.loads(structuring_response.text)
-        structured_content_str = llm_output['message']['content'].strip()
-        print(f"ADIM 2 BAŞARILI: Llama-3p1-8b modelinden dönen ham yanıt: {structured_content_str}")
-        
-        try:
-            structured_content_json = json.loads(structured_content_str)
-        except json.JSONDecodeError:
-            print("UYARI: LLM'den geçersiz JSON formatı döndü. Ham yanıt saklanıyor.")
-            structured_content_json = {"error": "Invalid JSON format from LLM", "raw_response": structured_content_str}
-        
+        structured_content_json = structure_page_text(raw_text, stats=structuring_stats)
     except requests.exceptions.RequestException as e:
         print(f"HATA: Yapılandırma modeli bağlantı hatası veya hazır değil. Hata: {e}")
         return Response(
             {"detail": f"Yapılandırma modeli (Llama) bağlantı hatası veya hazır değil. Hata: {e}"},
             status=status.HTTP_503_SERVICE_UNAVAILABLE
         )
+    except PromptBudgetError as e:
+        print(f"HATA: Sayfa metni yapılandırma modelinin bağlam penceresine sığmıyor. Hata: {e}")
+        return Response({"detail": str(e)}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
     except Exception as e:
         print(f"HATA: İşlem sırasında beklenmedik bir hata oluştu: {e}")
         return Response({"detail": f"İşlem sırasında beklenmedik bir hata oluştu: {e}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -328,7 +444,11 @@ def grade_full_page_answers(request):
         "processing_times_ms": {
             "llama_vision": round(vision_duration, 2),
             "llama_structuring": round(structuring_duration, 2),
-        }
+        },
+        "prompt_tokens": {
+            "llama_vision": vision_stats.get('prompt_tokens'),
+            "llama_structuring": structuring_stats.get('prompt_tokens'),
+        },
     }
     print(f"SONUÇ: Son yanıt döndürülüyor: {json.dumps(final_response, indent=2)}")
     return Response(final_response, status=status.HTTP_200_OK)
@@ -348,6 +468,8 @@ def grade_text_answer(request):
     reference_text = request.data.get('reference_text')
     grading_criteria = request.data.get('criteria', '').strip()
     student_answer_text = request.data.get('answer')
+    exam = request.data.get('exam', '')
+    student = request.data.get('student', '')
 
     if not all([question_text, reference_text, student_answer_text]):
         return Response(
@@ -357,13 +479,22 @@ def grade_text_answer(request):
     print("\nAPI ÇAĞRISI: grade_text_answer")
     try:
         grading_result = get_llm_grading(question_text, reference_text, student_answer_text, grading_criteria)
+    except PromptBudgetError as e:
+        return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         return Response({"detail": str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
 
+    store_graded_results([GradedResult.from_grading(
+        grading_result['grading'], question_text, student_answer_text, exam=exam, student=student,
+        source=GradedResult.SOURCE_TEXT, processing_time_ms=grading_result['processing_time'],
+        prompt_tokens=grading_result['prompt_tokens'],
+    )])
+
     final_response = {
         "transcribed_answer": student_answer_text,
         "grading": grading_result['grading'],
-        "processing_times_ms": {"llama_grading": grading_result['processing_time']}
+        "processing_times_ms": {"llama_grading": grading_result['processing_time']},
+        "prompt_tokens": {"llama_grading": grading_result['prompt_tokens']},
     }
     print(f"SONUÇ: Son yanıt döndürülüyor: {json.dumps(final_response, indent=2)}")
     return Response(final_response, status=status.HTTP_200_OK)
@@ -371,6 +502,9 @@ def grade_text_answer(request):
 
 # --- API View: Çoklu Cevap (CSV) ---
 
+# CSV'de öğrenciyi tanımlayan sütun adları (ilk dolu olan kullanılır)
+CSV_STUDENT_COLUMNS = ('student', 'student_id', 'student_name', 'ogrenci', 'ogrenci_no')
+
 @api_view(['POST'])
 @permission_classes([AllowAny])
 @parser_classes([MultiPartParser, FormParser])
@@ -382,7 +516,11 @@ def grade_multiple_text_answers(request):
     question = request.data.get('question')
     reference_text = request.data.get('reference_text')
     grading_criteria = request.data.get('criteria')
+    exam = request.data.get('exam', '')
 
+    too_large = _upload_too_large_response(request, csv_file, UPLOAD_MAX_CSV_SIZE, "CSV dosyası")
+    if too_large:
+        return too_large
     if not all([csv_file, question, reference_text]):
         return Response(
             {"detail": "Lütfen 'csv_file', 'question' ve 'reference_text' alanlarını doldurun."},
@@ -410,13 +548,14 @@ def grade_multiple_text_answers(request):
             return Response({"detail": "CSV dosyası boş veya başlık satırı eksik."}, status=status.HTTP_400_BAD_REQUEST)
         
         new_fieldnames = list(fieldnames)
-        for field in ['llm_grade', 'llm_reason', 'processing_time_ms']:
+        for field in ['llm_grade', 'llm_reason', 'processing_time_ms', 'prompt_tokens']:
             if field not in new_fieldnames:
                 new_fieldnames.append(field)
 
         temp_output = io.StringIO()
         writer = csv.DictWriter(temp_output, fieldnames=new_fieldnames, delimiter=';')
         writer.writeheader()
+        graded_results = []
 
         for i, row in enumerate(rows):
             print(f"\n--- Satır {i+1}/{len(rows)} işleniyor ---")
@@ -430,6 +569,7 @@ def grade_multiple_text_answers(request):
                 row['llm_grade'] = 'Eksik Veri'
                 row['llm_reason'] = 'CSV satırında student_answer sütunu boş veya bulunamadı.'
                 row['processing_time_ms'] = 0
+                row['prompt_tokens'] = 0
             else:
                 try:
                     print(f"--> get_llm_grading fonksiyonu çağrılıyor...")
@@ -437,6 +577,13 @@ def grade_multiple_text_answers(request):
                     row['llm_grade'] = grading_result['grading'].get('grade', 'N/A')
                     row['llm_reason'] = grading_result['grading'].get('reason', 'N/A')
                     row['processing_time_ms'] = grading_result['processing_time']
+                    row['prompt_tokens'] = grading_result['prompt_tokens']
+                    graded_results.append(GradedResult.from_grading(
+                        grading_result['grading'], question, student_answer, exam=exam,
+                        student=next((row[k] for k in CSV_STUDENT_COLUMNS if row.get(k)), ''),
+                        source=GradedResult.SOURCE_CSV, processing_time_ms=grading_result['processing_time'],
+                        prompt_tokens=grading_result['prompt_tokens'],
+                    ))
                 except Exception as e:
                     print(f"!!! HATA: Satır {i+1} işlenirken bir istisna (exception) oluştu.")
                     traceback.print_exc() 
@@ -444,12 +591,14 @@ def grade_multiple_text_answers(request):
                     row['llm_grade'] = 'API Hatası'
                     row['llm_reason'] = str(e)
                     row['processing_time_ms'] = 0
+                    row['prompt_tokens'] = 0
             
             if None in row:
                 del row[None]
             writer.writerow(row)
         
         print("\nBİLGİ: Tüm satırların işlenmesi tamamlandı. Yanıt dosyası oluşturuluyor.")
+        store_graded_results(graded_results)
         
         output_buffer = io.BytesIO()
         output_buffer.write(temp_output.getvalue().encode('utf-8'))
@@ -465,3 +614,610 @@ def grade_multiple_text_answers(request):
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
 
+
+
+# --- API View: Şablonlu Sınav Kağıdı (OMR) ---
+
+def _requested_template(data):
+    """İstekte verilen şablon değerini döndürür ('template_id', 'template_name' ya da 'template')."""
+    return data.get('template_id') or data.get('template_name') or data.get('template')
+
+
+def _find_template(data):
+    """
+    İstekteki şablonu bulur. 'template_id' sadece pk, 'template_name' sadece ad ile aranır.
+    Eski 'template' alanında önce ada bakılır, bulunamazsa sayısal değer pk kabul edilir;
+    böylece "2025" gibi sayısal adlı şablonlar da adıyla bulunabilir.
+    """
+    template_id = data.get('template_id')
+    if template_id:
+        return ExamTemplate.objects.filter(pk=template_id).first() if str(template_id).isdigit() else None
+    template_name = data.get('template_name')
+    if template_name:
+        return ExamTemplate.objects.filter(name=template_name).first()
+    value = data.get('template')
+    if not value:
+        return None
+    template = ExamTemplate.objects.filter(name=value).first()
+    if template is None and str(value).isdigit():
+        template = ExamTemplate.objects.filter(pk=value).first()
+    return template
+
+
+def _is_box(value):
+    """[x, y, w, h] biçiminde dört sayıdan oluşan bir kutu mu?"""
+    return (
+        isinstance(value, (list, tuple)) and len(value) == 4
+        and all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in value)
+    )
+
+
+def _validate_template_regions(regions):
+    """Şablon bölge tanımlarını kontrol eder; hata varsa açıklamasını döndürür."""
+    if not isinstance(regions, dict):
+        return "'regions' bir JSON nesnesi olmalıdır."
+    answer_boxes = regions.get('answer_boxes', [])
+    bubbles = regions.get('bubbles', [])
+    if not isinstance(answer_boxes, list) or not isinstance(bubbles, list):
+        return "'answer_boxes' ve 'bubbles' birer liste olmalıdır."
+    for box in answer_boxes:
+        if not isinstance(box, dict):
+            return "Her cevap kutusu bir JSON nesnesi olmalıdır."
+        if not _is_box(box.get('box')) or not box.get('question') or not box.get('reference_text'):
+            return f"Cevap kutusu eksik tanımlanmış: {box.get('id')} ('box', 'question', 'reference_text' gerekli)."
+    for bubble in bubbles:
+        if not isinstance(bubble, dict):
+            return "Her şık tanımı bir JSON nesnesi olmalıdır."
+        options = bubble.get('options')
+        if not isinstance(options, dict) or not options or not all(_is_box(b) for b in options.values()):
+            return f"Şık tanımı eksik: {bubble.get('id')} ('options' alanı {{şık: [x, y, w, h]}} olmalı)."
+        if bubble.get('correct') not in options:
+            return f"Şık tanımında doğru cevap bulunamadı: {bubble.get('id')}."
+    return None
+
+
+def _template_graded_results(template, student, multiple_choice, written_answers, source):
+    """Şablonlu bir sayfanın OMR ve yazılı cevap sonuçlarını GradedResult listesine çevirir."""
+    bubbles = {str(b.get('id')): b for b in template.regions.get('bubbles', [])}
+    results = []
+    for result in multiple_choice:
+        bubble = bubbles.get(str(result['id']), {})
+        results.append(GradedResult.from_grading(
+            result['grading'], bubble.get('question') or f"Soru {result['id']}",
+            ", ".join(result['marked']), exam=template.name, student=student, source=source,
+        ))
+    for result in written_answers:
+        results.append(GradedResult.from_grading(
+            result['grading'], result['question'], result['transcribed_answer'] or '',
+            exam=template.name, student=student, source=source,
+        ))
+    return results
+
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+@parser_classes([MultiPartParser, FormParser])
+def register_exam_template(request):
+    """
+    Boş sınav kağıdı şablonunu, cevap kutusu ve şık koordinatlarıyla birlikte kaydeder.
+    Aynı isimde bir şablon varsa günceller.
+    """
+    template_image = request.FILES.get('image')
+    name = request.data.get('name')
+    regions_raw = request.data.get('regions')
+
+    too_large = _upload_too_large_response(request, template_image, UPLOAD_MAX_IMAGE_SIZE, "Resim dosyası")
+    if too_large:
+        return too_large
+    if not all([template_image, name, regions_raw]):
+        return Response(
+            {"detail": "Lütfen 'image', 'name' ve 'regions' alanlarını doldurun."},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    print("API ÇAĞRISI: register_exam_template")
+
+    try:
+        regions = json.loads(regions_raw)
+    except json.JSONDecodeError as e:
+        return Response({"detail": f"'regions' geçerli bir JSON değil: {e}"}, status=status.HTTP_400_BAD_REQUEST)
+
+    error = _validate_template_regions(regions)
+    if error:
+        return Response({"detail": error}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        omr.decode_image(template_image.read())
+        template_image.seek(0)
+    except ValueError as e:
+        return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    template, created = ExamTemplate.objects.update_or_create(
+        name=name,
+        defaults={"image": template_image, "regions": regions},
+    )
+    print(f"BİLGİ: '{name}' şablonu {'kaydedildi' if created else 'güncellendi'} (id={template.pk}).")
+    return Response(
+        {
+            "id": template.pk,
+            "name": template.name,
+            "answer_boxes": len(regions.get('answer_boxes', [])),
+            "bubbles": len(regions.get('bubbles', [])),
+        },
+        status=status.HTTP_201_CREATED if created else status.HTTP_200_OK
+    )
+
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+@parser_classes([MultiPartParser, FormParser])
+def grade_template_page(request):
+    """
+    Kayıtlı bir şablona göre doldurulmuş sınav kağıdını notlandırır.
+    Sayfa şablona hizalanır, şıklar OMR ile (model çağrısı olmadan) okunur,
+    sadece el yazısı cevap kutuları Llama Vision ve Llama-3p1-8b'ye gönderilir.
+    """
+    page_image = request.FILES.get('image')
+    requested_template = _requested_template(request.data)
+    student = request.data.get('student', '')
+
+    too_large = _upload_too_large_response(request, page_image, UPLOAD_MAX_IMAGE_SIZE, "Resim dosyası")
+    if too_large:
+        return too_large
+    if not all([page_image, requested_template]):
+        return Response(
+            {"detail": "Lütfen 'image' ve 'template_id', 'template_name' ya da 'template' alanlarını doldurun."},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    print("API ÇAĞRISI: grade_template_page")
+
+    template = _find_template(request.data)
+    if template is None:
+        return Response({"detail": f"Şablon bulunamadı: {requested_template}"}, status=status.HTTP_404_NOT_FOUND)
+
+    # Step 1: Şablona hizalama
+    start_time_alignment = time.time()
+    try:
+        page = omr.decode_image(page_image.read())
+        aligned = omr.align_to_template(page, template)
+    except (ValueError, omr.TemplateAlignmentError) as e:
+        print(f"HATA: Sayfa şablona hizalanamadı. Hata: {e}")
+        return Response({"detail": f"Sayfa şablona hizalanamadı: {e}"}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+    alignment_duration = (time.time() - start_time_alignment) * 1000
+    print(f"Hizalama işlem süresi: {alignment_duration:.2f} ms")
+
+    # Step 2: Çoktan seçmeli sorular (OMR)
+    start_time_omr = time.time()
+    bubble_results = omr.grade_page_bubbles(aligned, template)
+    omr_duration = (time.time() - start_time_omr) * 1000
+
+    # Step 3: El yazısı kutuları. Önce tüm OCR adımları, sonra notlandırma yapılır;
+    # böylece modeller arasında gidip gelinmez.
+    answer_boxes = template.regions.get('answer_boxes', [])
+    start_time_vision = time.time()
+    vision_stats = {}
+    transcriptions = []
+    for box in answer_boxes:
+        try:
+            crop_base64 = base64.b64encode(omr.encode_jpeg(omr.crop_box(aligned, box['box']))).decode('utf-8')
+            transcriptions.append(transcribe_handwriting(crop_base64, stats=vision_stats))
+        except Exception as e:
+            print(f"HATA: Kutu {box.get('id')} için OCR başarısız oldu. Hata: {e}")
+            transcriptions.append(None)
+    vision_duration = (time.time() - start_time_vision) * 1000
+
+    start_time_grading = time.time()
+    grading_prompt_tokens = 0
+    answer_results = []
+    for box, student_answer_text in zip(answer_boxes, transcriptions):
+        result = {"id": box.get('id'), "question": box['question'], "transcribed_answer": student_answer_text}
+        if student_answer_text is None:
+            result["grading"] = {"grade": "OCR Hatası", "reason": "El yazısı metne çevrilemedi."}
+        elif not student_answer_text:
+            result["grading"] = {"grade": 0, "reason": "Cevap kutusu boş."}
+        else:
+            try:
+                grading_result = get_llm_grading(
+                    box['question'], box['reference_text'], student_answer_text, box.get('criteria')
+                )
+                result["grading"] = grading_result['grading']
+                grading_prompt_tokens += grading_result['prompt_tokens']
+            except Exception as e:
+                result["grading"] = {"grade": "API Hatası", "reason": str(e)}
+        answer_results.append(result)
+    grading_duration = (time.time() - start_time_grading) * 1000
+
+    store_graded_results(_template_graded_results(
+        template, student, bubble_results, answer_results, GradedResult.SOURCE_TEMPLATE
+    ))
+
+    final_response = {
+        "template": template.name,
+        "multiple_choice": bubble_results,
+        "written_answers": answer_results,
+        "processing_times_ms": {
+            "alignment": round(alignment_duration, 2),
+            "omr": round(omr_duration, 2),
+            "llama_vision": round(vision_duration, 2),
+            "llama_grading": round(grading_duration, 2),
+        },
+        "prompt_tokens": {
+            "llama_vision": vision_stats.get('prompt_tokens', 0),
+            "llama_grading": grading_prompt_tokens,
+        },
+    }
+    print(f"SONUÇ: Son yanıt döndürülüyor: {json.dumps(final_response, indent=2, ensure_ascii=False)}")
+    return Response(final_response, status=status.HTTP_200_OK)
+
+
+# --- API View: Toplu Tarama (PDF / Zip) ---
+
+BATCH_MAX_IMAGE_SIDE = 2000  # Tam sayfa modunda Llama Vision'a gönderilen en uzun kenar (piksel)
+
+
+def _parse_students(raw):
+    """
+    'students' alanını öğrenci adı listesine çevirir. JSON dizisi (sadece metin öğeler), JSON
+    metin/sayı ya da virgülle ayrılmış metin kabul edilir; başka bir şeyse None döndürür.
+    """
+    if raw in (None, ''):
+        return []
+    value = raw
+    if isinstance(raw, str):
+        try:
+            value = json.loads(raw)
+        except json.JSONDecodeError:
+            value = raw
+    if isinstance(value, list):
+        if not all(isinstance(s, str) for s in value):
+            return None
+        return [s.strip() for s in value if s.strip()]
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        value = raw if isinstance(raw, str) else str(value)
+    if isinstance(value, str):
+        return [s.strip() for s in value.split(',') if s.strip()]
+    return None
+
+
+def _timed_stage(stage_name, func):
+    def run(item):
+        start_time = time.time()
+        func(item)
+        item.timings_ms[stage_name] = round((time.time() - start_time) * 1000, 2)
+    return run
+
+
+def _full_page_batch_stages():
+    """Şablonsuz sayfalar için: küçült -> Llama Vision ham metin -> Llama-3p1-8b yapılandırma."""
+
+    def preprocess(item):
+        height, width = item.image.shape[:2]
+        scale = BATCH_MAX_IMAGE_SIDE / max(height, width)
+        image = item.image
+        if scale < 1:
+            image = cv2.resize(image, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+        item.data['image_base64'] = base64.b64encode(omr.encode_jpeg(image)).decode('utf-8')
+        item.image = None
+
+    def ocr(item):
+        stats = {}
+        item.data['raw_text_from_vision'] = extract_page_text(item.data.pop('image_base64'), stats=stats)
+        item.data.setdefault('prompt_tokens', {})['llama_vision'] = stats.get('prompt_tokens')
+
+    def grade(item):
+        stats = {}
+        item.data['structured_content'] = structure_page_text(item.data['raw_text_from_vision'], stats=stats)
+        item.data.setdefault('prompt_tokens', {})['llama_structuring'] = stats.get('prompt_tokens')
+
+    return [
+        ("preprocess", _timed_stage("preprocess", preprocess)),
+        # OCR sonrası sayfalar sadece metin taşır; kuyruk sınırsızdır ki tüm OCR işleri
+        # yapılandırma modeline geçmeden bitsin (modeller birbirini bellekten atmasın).
+        ("llama_vision", _timed_stage("llama_vision", ocr), batch.UNBOUNDED),
+        ("llama_structuring", _timed_stage("llama_structuring", grade), batch.UNBOUNDED),
+    ]
+
+
+def _template_batch_stages(template):
+    """Şablonlu sayfalar için: hizala + OMR -> kutuları OCR -> kutuları notlandır."""
+    answer_boxes = template.regions.get('answer_boxes', [])
+
+    def preprocess(item):
+        aligned = omr.align_to_template(item.image, template)
+        item.image = None
+        item.data['multiple_choice'] = omr.grade_page_bubbles(aligned, template)
+        item.data['crops'] = [
+            base64.b64encode(omr.encode_jpeg(omr.crop_box(aligned, box['box']))).decode('utf-8')
+            for box in answer_boxes
+        ]
+
+    def ocr(item):
+        stats = {}
+        transcriptions = []
+        for crop_base64 in item.data.pop('crops'):
+            try:
+                transcriptions.append(transcribe_handwriting(crop_base64, stats=stats))
+            except Exception as e:
+                print(f"HATA: {item.source} sayfasında OCR başarısız oldu. Hata: {e}")
+                transcriptions.append(None)
+        item.data['transcriptions'] = transcriptions
+        item.data.setdefault('prompt_tokens', {})['llama_vision'] = stats.get('prompt_tokens', 0)
+
+    def grade(item):
+        prompt_tokens = 0
+        answer_results = []
+        for box, student_answer_text in zip(answer_boxes, item.data.pop('transcriptions')):
+            result = {"id": box.get('id'), "question": box['question'], "transcribed_answer": student_answer_text}
+            if student_answer_text is None:
+                result["grading"] = {"grade": "OCR Hatası", "reason": "El yazısı metne çevrilemedi."}
+            elif not student_answer_text:
+                result["grading"] = {"grade": 0, "reason": "Cevap kutusu boş."}
+            else:
+                try:
+                    grading_result = get_llm_grading(
+                        box['question'], box['reference_text'], student_answer_text, box.get('criteria')
+                    )
+                    result["grading"] = grading_result['grading']
+                    prompt_tokens += grading_result['prompt_tokens']
+                except Exception as e:
+                    result["grading"] = {"grade": "API Hatası", "reason": str(e)}
+            answer_results.append(result)
+        item.data['written_answers'] = answer_results
+        item.data.setdefault('prompt_tokens', {})['llama_grading'] = prompt_tokens
+
+    return [
+        ("preprocess", _timed_stage("alignment_omr", preprocess)),
+        # OCR sonrası sayfalar sadece metin taşır (kırpıntılar bırakılır); kuyruk sınırsızdır ki
+        # tüm OCR işleri notlandırma modeline geçmeden bitsin.
+        ("llama_vision", _timed_stage("llama_vision", ocr), batch.UNBOUNDED),
+        ("llama_grading", _timed_stage("llama_grading", grade), batch.UNBOUNDED),
+    ]
+
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+@parser_classes([MultiPartParser, FormParser])
+def grade_batch_pages(request):
+    """
+    Çok sayfalı PDF veya resim içeren zip dosyasını sayfa sayfa, aşamalı bir pipeline ile işler.
+    Şablon ('template_id', 'template_name' ya da 'template') verilirse sayfalar şablona göre
+    (OMR + kutu notlandırma), verilmezse tam sayfa olarak işlenir. Sonuçlar öğrenci ve sayfa
+    numarasına göre gruplanır.
+    """
+    batch_file = request.FILES.get('file')
+    requested_template = _requested_template(request.data)
+    students_raw = request.data.get('students')
+
+    too_large = _upload_too_large_response(request, batch_file, UPLOAD_MAX_BATCH_SIZE, "Dosya")
+    if too_large:
+        return too_large
+    if not batch_file:
+        return Response(
+            {"detail": "Lütfen PDF veya zip olarak 'file' alanını doldurun."},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    print("API ÇAĞRISI: grade_batch_pages")
+
+    try:
+        pages_per_student = int(request.data.get('pages_per_student', 1))
+        if pages_per_student < 1:
+            raise ValueError
+    except (TypeError, ValueError):
+        return Response({"detail": "'pages_per_student' pozitif bir tam sayı olmalıdır."}, status=status.HTTP_400_BAD_REQUEST)
+
+    students = _parse_students(students_raw)
+    if students is None:
+        return Response(
+            {"detail": "'students' bir öğrenci adı listesi (JSON) ya da virgülle ayrılmış metin olmalıdır."},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    template = None
+    if requested_template:
+        template = _find_template(request.data)
+        if template is None:
+            return Response({"detail": f"Şablon bulunamadı: {requested_template}"}, status=status.HTTP_404_NOT_FOUND)
+
+    stages = _template_batch_stages(template) if template else _full_page_batch_stages()
+
+    start_time = time.time()
+    results = {}
+    page_count = 0
+    error_count = 0
+    try:
+        pages = batch.iter_batch_pages(batch_file, students=students, pages_per_student=pages_per_student)
+        for item in batch.run_pipeline(pages, stages):
+            page_count += 1
+            page_result = {"source": item.source, "page": item.page}
+            page_result.update(item.data)
+            if item.error:
+                error_count += 1
+                page_result["error"] = item.error
+            page_result["processing_times_ms"] = item.timings_ms
+            results.setdefault(item.student, []).append(page_result)
+            if template and not item.error:
+                store_graded_results(_template_graded_results(
+                    template, item.student, item.data['multiple_choice'], item.data['written_answers'],
+                    GradedResult.SOURCE_BATCH
+                ))
+            print(f"BİLGİ: {item.student} / sayfa {item.page} tamamlandı ({page_count}. sayfa).")
+    except batch.BatchInputError as e:
+        return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        print(f"HATA: Toplu tarama sırasında beklenmedik bir hata oluştu: {e}")
+        traceback.print_exc()
+        return Response({"detail": f"Dosya işlenirken bir hata oluştu: {e}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    if page_count == 0:
+        return Response({"detail": "Dosyada işlenecek sayfa bulunamadı."}, status=status.HTTP_400_BAD_REQUEST)
+
+    final_response = {
+        "template": template.name if template else None,
+        "page_count": page_count,
+        "error_count": error_count,
+        "students": results,
+        "processing_times_ms": {"total": round((time.time() - start_time) * 1000, 2)},
+    }
+    print(f"SONUÇ: {page_count} sayfa işlendi ({error_count} hatalı).")
+    return Response(final_response, status=status.HTTP_200_OK)
+
+
+# --- API View: Metrikler ---
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def llm_metrics(request):
+    """
+    Model çıktılarının JSON çözümleme istatistiklerini (doğrudan, onarılan, yeniden denenen,
+    başarısız) ve başarısızlık oranlarını döndürür.
+    """
+    return Response({"json_parse": parse_metrics.snapshot()}, status=status.HTTP_200_OK)
+
+
+# --- API View: Notlandırma Sonuçları (listeleme / istatistik / dışa aktarma) ---
+
+RESULT_ORDERING_FIELDS = ('grade', 'created_at', 'student', 'exam', 'question')
+EXPORT_FIELDS = GradedResultSerializer.Meta.fields
+EXPORT_CHUNK_SIZE = 2000
+
+
+class GradedResultPagination(PageNumberPagination):
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+
+def _filter_graded_results(params):
+    """
+    Sorgu parametrelerine göre GradedResult kümesini filtreler ve sıralar.
+    Desteklenen parametreler: exam, question, question_key, student, source, grade_min,
+    grade_max, ordering. `question` tam soru metnidir ve özeti üzerinden aranır.
+    Hatalı parametrede ValueError fırlatır.
+    """
+    queryset = GradedResult.objects.all()
+    for field in ('exam', 'question_key', 'student', 'source'):
+        value = params.get(field)
+        if value:
+            queryset = queryset.filter(**{field: value})
+    if params.get('question'):
+        queryset = queryset.filter(question_key=GradedResult.make_question_key(params['question']))
+    if params.get('grade_min'):
+        queryset = queryset.filter(grade__gte=float(params['grade_min']))
+    if params.get('grade_max'):
+        queryset = queryset.filter(grade__lte=float(params['grade_max']))
+
+    ordering = params.get('ordering')
+    if ordering:
+        if ordering.lstrip('-') not in RESULT_ORDERING_FIELDS:
+            raise ValueError(f"Geçersiz sıralama alanı: {ordering}")
+        queryset = queryset.order_by(ordering, '-id')
+    return queryset
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def list_graded_results(request):
+    """
+    Kaydedilmiş notlandırma sonuçlarını sayfalı ve filtrelenebilir şekilde listeler.
+    """
+    try:
+        queryset = _filter_graded_results(request.query_params)
+    except ValueError as e:
+        return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    paginator = GradedResultPagination()
+    page = paginator.paginate_queryset(queryset, request)
+    return paginator.get_paginated_response(GradedResultSerializer(page, many=True).data)
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def graded_result_stats(request):
+    """
+    Filtrelenmiş sonuçlar için soru başına ortalama / en düşük / en yüksek not ve not
+    dağılımını veritabanı toplama sorgularıyla hesaplar.
+    """
+    try:
+        queryset = _filter_graded_results(request.query_params)
+    except ValueError as e:
+        return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    queryset = queryset.order_by()
+
+    per_question = list(
+        queryset.values('exam', 'question_key')
+        .annotate(
+            question_text=Min('question'),
+            count=Count('id'),
+            graded_count=Count('grade'),
+            ungraded_count=Count('id', filter=Q(grade__isnull=True)),
+            average=Avg('grade'),
+            minimum=Min('grade'),
+            maximum=Max('grade'),
+        )
+        .order_by('exam', 'question_text')
+    )
+    distribution = {}
+    for row in (queryset.filter(grade__isnull=False)
+                .values('exam', 'question_key', 'grade')
+                .annotate(count=Count('id'))
+                .order_by('exam', 'question_key', 'grade')):
+        distribution.setdefault((row['exam'], row['question_key']), []).append(
+            {"grade": row['grade'], "count": row['count']}
+        )
+    for row in per_question:
+        row['question'] = row.pop('question_text')
+        if row['average'] is not None:
+            row['average'] = round(row['average'], 2)
+        row['distribution'] = distribution.get((row['exam'], row['question_key']), [])
+
+    overall = queryset.aggregate(count=Count('id'), average=Avg('grade'), minimum=Min('grade'), maximum=Max('grade'))
+    if overall['average'] is not None:
+        overall['average'] = round(overall['average'], 2)
+    return Response({"overall": overall, "questions": per_question}, status=status.HTTP_200_OK)
+
+
+class _Echo:
+    """csv.writer için yazılanı olduğu gibi döndüren dosya benzeri nesne."""
+
+    def write(self, value):
+        return value
+
+
+def _iter_results_csv(queryset):
+    writer = csv.writer(_Echo(), delimiter=';')
+    yield '\ufeff' + writer.writerow(EXPORT_FIELDS)
+    for row in queryset.values_list(*EXPORT_FIELDS).iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield writer.writerow(row)
+
+
+def _iter_results_json(queryset):
+    yield '['
+    first = True
+    for row in queryset.values(*EXPORT_FIELDS).iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        row['created_at'] = row['created_at'].isoformat()
+        yield ('' if first else ',') + json.dumps(row, ensure_ascii=False)
+        first = False
+    yield ']'
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def export_graded_results(request):
+    """
+    Filtrelenmiş sonuçları CSV (varsayılan) veya JSON olarak akışla dışa aktarır.
+    Satırlar sunucu tarafı imleçle (iterator) parça parça okunur; tüm sonuçlar belleğe alınmaz.
+    """
+    export_format = request.query_params.get('export_format', 'csv')
+    if export_format not in ('csv', 'json'):
+        return Response({"detail": "'export_format' csv veya json olmalıdır."}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        queryset = _filter_graded_results(request.query_params)
+    except ValueError as e:
+        return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    print(f"API ÇAĞRISI: export_graded_results ({export_format})")
+    if export_format == 'json':
+        response = StreamingHttpResponse(_iter_results_json(queryset), content_type='application/json')
+    else:
+        response = StreamingHttpResponse(_iter_results_csv(queryset), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="graded_results.{export_format}"'
+    return response